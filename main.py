@@ -1,24 +1,337 @@
+from time import monotonic
+IMPORT_STARTED = monotonic()
+
 import os
 import base64
-import requests
-from typing import List, Optional, Dict, Any
+import hashlib
+import json
+import asyncio
+import sqlite3
+import threading
+import contextvars
+from bisect import bisect_left
+import importlib
+import httpx
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import FastAPI, Request, HTTPException, Query, Body
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel, ValidationError
 from datetime import time, datetime, timedelta
-import yfinance as yf
 import pytz
 import logging
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 # Add this line to define the logger
 logger = logging.getLogger("uvicorn.error")
 
-app = FastAPI()
+class LazyModule:
+    """
+    Stand-in for a heavy module that is imported on first attribute access,
+    so code keeps using yf./pd./np. as usual while cold start skips them.
+    load() forces the import (used by the background warm-up).
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.module = None
+        self.import_seconds = None
+
+    def load(self):
+        if self.module is None:
+            started = monotonic()
+            module = importlib.import_module(self.name)
+            if self.module is None:
+                self.import_seconds = round(monotonic() - started, 3)
+                self.module = module
+        return self.module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+# The market-data stack (yfinance pulls in pandas/numpy) costs most of the
+# import time and is only needed by prices, portfolio, analytics and
+# recurring expenses
+yf = LazyModule("yfinance")
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+LAZY_MODULES = (yf, pd, np)
 
 API_KEY = os.environ["API_KEY"]
 ORACLE_URL = os.environ["DB_URL"]
 USERNAME = os.environ["DB_USER"]
 PASSWORD = os.environ["DB_PASSWORD"]
 
+# Import the market-data stack in the background right after startup ("1"),
+# or only when a request first needs it ("0")
+WARM_MARKET_STACK = os.environ.get("WARM_MARKET_STACK", "1") == "1"
+
+# Background refresh: each reference dataset, the transactions frame and
+# the held tickers' prices are loaded at startup and then re-loaded every
+# REFRESH_*_INTERVAL seconds (0 = load at startup only)
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") == "1"
+REFRESH_REFERENCE_INTERVAL = float(os.environ.get("REFRESH_REFERENCE_INTERVAL", "900"))
+REFRESH_TRANSACTIONS_INTERVAL = float(os.environ.get("REFRESH_TRANSACTIONS_INTERVAL", "240"))
+REFRESH_PRICES_INTERVAL = float(os.environ.get("REFRESH_PRICES_INTERVAL", "30"))
+
+# Upstream (ORDS) connection pool + timeouts
+ORDS_POOL_SIZE = int(os.environ.get("ORDS_POOL_SIZE", "20"))
+ORDS_CONNECT_TIMEOUT = float(os.environ.get("ORDS_CONNECT_TIMEOUT", "5"))
+ORDS_READ_TIMEOUT = float(os.environ.get("ORDS_READ_TIMEOUT", "30"))
+ORDS_TIMEOUT = httpx.Timeout(ORDS_READ_TIMEOUT, connect=ORDS_CONNECT_TIMEOUT)
+
+# Overall deadline (s) for one ORDS read, hedges included
+ORDS_DEADLINE = float(os.environ.get("ORDS_DEADLINE", "20"))
+
+# Hedged reads: once an upstream has HEDGE_MIN_SAMPLES latencies for a call
+# type, a read still running past that type's HEDGE_PERCENTILE latency gets
+# a duplicate. Each call earns HEDGE_BUDGET hedge tokens (capped), so
+# hedges stay around that share of traffic even during a stall
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", "0.05"))
+HEDGE_BUDGET = float(os.environ.get("HEDGE_BUDGET", "0.1"))
+LATENCY_WINDOW = int(os.environ.get("LATENCY_WINDOW", "200"))
+
+# Circuit breaker: consecutive failures that open it, and seconds it stays
+# open before one trial call is let through
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.environ.get("BREAKER_RESET", "30"))
+
+# ORDS result paging: rows per page, and whether to fetch page N+1 while
+# page N is being consumed
+ORDS_PAGE_SIZE = int(os.environ.get("ORDS_PAGE_SIZE", "500"))
+ORDS_PREFETCH = os.environ.get("ORDS_PREFETCH", "1") == "1"
+# Column every paged query is ordered and keyset-paged by, so a write
+# between pages cannot duplicate or skip rows ("" = plain offset paging)
+ORDS_PAGE_KEY = os.environ.get("ORDS_PAGE_KEY", "ID")
+
+# yfinance is blocking, so Yahoo lookups get their own pool instead of
+# competing with the request threadpool
+YAHOO_WORKERS = int(os.environ.get("YAHOO_WORKERS", "16"))
+
+# /tickerPrices fan-out: symbols fetched at once, and per-symbol deadline (s)
+TICKER_CONCURRENCY = int(os.environ.get("TICKER_CONCURRENCY", "8"))
+TICKER_DEADLINE = float(os.environ.get("TICKER_DEADLINE", "10"))
+# "per-symbol" (one Ticker per symbol, fanned out on yahoo_executor) or
+# "batch" (listing details fanned out per symbol, then one yf.download for
+# the intraday bars; symbols it leaves unpriced, or all of them if it fails
+# or times out, go through the per-symbol path). yf.download still makes
+# one history request per symbol on its own threads (capped at
+# TICKER_CONCURRENCY), so "batch" changes where the fan-out runs, not how
+# many requests reach Yahoo
+PRICE_ENGINE = os.environ.get("PRICE_ENGINE", "per-symbol")
+
+# Price cache TTLs (seconds) by market session; closed markets are cached
+# until the next session starts
+PRICE_TTL_REGULAR = float(os.environ.get("PRICE_TTL_REGULAR", "15"))
+PRICE_TTL_EXTENDED = float(os.environ.get("PRICE_TTL_EXTENDED", "60"))
+PRICE_CACHE_MAX_ENTRIES = int(os.environ.get("PRICE_CACHE_MAX_ENTRIES", "1024"))
+
+# Symbol metadata (exchange/tz/currency) store and how long before a row is
+# refreshed in the background (default 7 days)
+SYMBOL_META_DB = os.environ.get("SYMBOL_META_DB", "symbol_meta.sqlite3")
+SYMBOL_META_TTL = float(os.environ.get("SYMBOL_META_TTL", str(7 * 24 * 3600)))
+# Rows where Yahoo gave no exchange or timezone (throttled, unknown symbol)
+# hold defaults; they stay in memory only, and only this long (s)
+SYMBOL_META_RETRY = float(os.environ.get("SYMBOL_META_RETRY", "300"))
+
+# Batch upserts: max rows per request and max ORDS calls in flight per batch
+ORDS_BATCH_MAX_ROWS = int(os.environ.get("ORDS_BATCH_MAX_ROWS", "1000"))
+ORDS_BATCH_CONCURRENCY = int(os.environ.get("ORDS_BATCH_CONCURRENCY", "8"))
+
+# Reward-limit memo: safety-net TTL (s) on top of write-triggered eviction
+REWARD_CACHE_TTL = float(os.environ.get("REWARD_CACHE_TTL", "900"))
+REWARD_CACHE_MAX_ENTRIES = int(os.environ.get("REWARD_CACHE_MAX_ENTRIES", "4096"))
+
+# POSTSTATUS given to expenses generated from recurring rules
+RECUR_POST_STATUS = os.environ.get("RECUR_POST_STATUS", "Pending")
+# Occurrences per rule written concurrently in one round; a rule that is
+# N dates behind takes ceil(N / RECUR_WRITE_CHUNK) sequential rounds
+RECUR_WRITE_CHUNK = int(os.environ.get("RECUR_WRITE_CHUNK", "31"))
+
+# Delta sync: column compared against since= (UPDATEDDT is written by the
+# clients; point this at a DB-maintained column if the schema has one), and
+# how far (s) the returned watermark is held behind the server clock so
+# late commits and client clock skew are not skipped
+DELTA_COLUMN = os.environ.get("DELTA_COLUMN", "UPDATEDDT")
+DELTA_LOOKBACK = float(os.environ.get("DELTA_LOOKBACK", "60"))
+
+# Warm transactions (/expenses, analytics): max age (s) before a request
+# triggers a delta refresh, and how often (s) the rows are re-read in full
+# so changes the delta cannot see (rows written outside this API with an
+# older DELTA_COLUMN) are picked up
+TRANSACTIONS_FRAME_TTL = float(os.environ.get("TRANSACTIONS_FRAME_TTL", "300"))
+TRANSACTIONS_FULL_RELOAD = float(os.environ.get("TRANSACTIONS_FULL_RELOAD", "3600"))
+
+# ID block allocation: IDs reserved per refill, and pool size that triggers
+# a background refill
+ID_BLOCK_SIZE = int(os.environ.get("ID_BLOCK_SIZE", "20"))
+ID_LOW_WATER = int(os.environ.get("ID_LOW_WATER", "5"))
+
+# Reference-data cache: bounded LRU, per-dataset TTL (seconds) overridable
+# with CACHE_TTL_<dataset>, e.g. CACHE_TTL_category_query=600
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", "256"))
+QUERY_CACHE_DEFAULT_TTL = float(os.environ.get("QUERY_CACHE_DEFAULT_TTL", "3600"))
+REFERENCE_CACHE_TTLS = {
+    dataset: float(os.environ.get(f"CACHE_TTL_{dataset}", QUERY_CACHE_DEFAULT_TTL))
+    for dataset in (
+        "category_query",
+        "card_category_query",
+        "cards_query",
+        "card_cycles_query",
+        "venue_mapping_query",
+        "reward_category_limit_query",
+        "card_category_limit_query",
+    )
+}
+
+# Response compression: bodies under COMPRESS_MIN_SIZE bytes go out as-is.
+# gzip applies to every response; brotli is used for list endpoints when the
+# brotli package is installed and the client accepts it
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+
+# Built once instead of base64-encoding the credentials on every call
+ORDS_AUTH_HEADER = "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+ORDS_JSON_HEADERS = {"Content-Type": "application/json", "Authorization": ORDS_AUTH_HEADER}
+
+
+def build_ords_client() -> httpx.AsyncClient:
+    """
+    One keep-alive async client for the lifetime of the app, so ORDS calls
+    reuse pooled TCP/TLS connections and never block the event loop.
+    """
+    limits = httpx.Limits(max_connections=ORDS_POOL_SIZE, max_keepalive_connections=ORDS_POOL_SIZE)
+    return httpx.AsyncClient(limits=limits, timeout=ORDS_TIMEOUT)
+
+ords_client = build_ords_client()
+yahoo_executor = ThreadPoolExecutor(max_workers=YAHOO_WORKERS, thread_name_prefix="yahoo")
+
+
+################# Settings ##############################
+
+# Every SQL / ORDS handler URL the endpoints use, by env var name
+QUERY_SETTINGS = (
+    "transactions_query",
+    "cards_query",
+    "venue_mapping_query",
+    "category_query",
+    "card_category_query",
+    "recur_expense_query",
+    "reward_category_limit_query",
+    "card_category_limit_query",
+    "card_cycles_query",
+    "reward_limit_query",
+    "reward_category_limit_usage_query",
+    "investment_veh_query",
+    "investment_unit_query",
+)
+URL_SETTINGS = (
+    "get_expense_url",
+    "get_budget_id_url",
+    "get_recur_expense_id_url",
+    "get-invest-veh-id-url",
+    "get-invest-unit-id-url",
+    "GET_REWARD_TOTAL_MONTH_URL",
+    "ORACLE_INSERT_EXPENSE_URL",
+    "ORACLE_INSERT_BUDGET_URL",
+    "ORACLE_INSERT_RECUR_EXPENSE_URL",
+    "ORACLE_INSERT_INVEST_VEH_URL",
+    "ORACLE_INSERT_INVESTMENT_UNIT_URL",
+    "ORACLE_INSERT_REWARD_LIMIT_URL",
+    "ORACLE_QUERY_REWARD_LIMIT_URL",
+    "ORACLE_QUERY_REWARD_BY_CARD_URL",
+)
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    The *_query / *_URL settings, read and checked once at boot instead of
+    from os.environ on every request. Problems are logged at startup and
+    only fail the endpoints that need the setting.
+    """
+    queries: Dict[str, str]
+    urls: Dict[str, str]
+    problems: Dict[str, str]
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        queries, urls, problems = {}, {}, {}
+        for name in QUERY_SETTINGS:
+            value = os.environ.get(name, "").strip()
+            if value:
+                queries[name] = value
+            else:
+                problems[name] = "missing"
+        for name in URL_SETTINGS:
+            value = os.environ.get(name, "").strip()
+            if not value:
+                problems[name] = "missing"
+            elif not value.startswith(("http://", "https://")):
+                problems[name] = "not an http(s) URL"
+            else:
+                urls[name] = value
+        return cls(queries=queries, urls=urls, problems=problems)
+
+    def query(self, name: str) -> str:
+        if name not in self.queries:
+            raise HTTPException(status_code=500, detail=f"{name} is not configured ({self.problems.get(name, 'unknown')})")
+        return self.queries[name]
+
+    def url(self, name: str) -> str:
+        if name not in self.urls:
+            raise HTTPException(status_code=500, detail=f"{name} is not configured ({self.problems.get(name, 'unknown')})")
+        return self.urls[name]
+
+settings = Settings.from_env()
+for name, problem in settings.problems.items():
+    logger.warning(f"Setting {name}: {problem}")
+
+def warm_market_stack():
+    if all(module.module is not None for module in LAZY_MODULES):
+        return
+    for module in LAZY_MODULES:
+        module.load()
+    logger.info("Market-data stack loaded: " + ", ".join(f"{m.name} {m.import_seconds}s" for m in LAZY_MODULES))
+
+STARTUP = {}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    STARTUP["readySeconds"] = round(monotonic() - IMPORT_STARTED, 3)
+    logger.info(f"Startup: module import {STARTUP['moduleImportSeconds']}s, ready after {STARTUP['readySeconds']}s")
+    if WARM_MARKET_STACK:
+        asyncio.get_running_loop().run_in_executor(yahoo_executor, warm_market_stack)
+    refresh_tasks = [asyncio.create_task(job.run_forever()) for job in refresh_jobs] if WARMUP_ENABLED else []
+    yield
+    for task in refresh_tasks:
+        task.cancel()
+    await ords_client.aclose()
+    yahoo_executor.shutdown(wait=False)
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE, compresslevel=GZIP_LEVEL)
+
 
 class Expense(BaseModel):
     ID: int
@@ -75,6 +388,9 @@ class QueryRewardLimit(BaseModel):
 class QueryRewardByCard(BaseModel):
     P1_CARDID: int
 
+class QueryRewardByCards(BaseModel):
+    P1_CARDIDS: Optional[List[int]] = None
+
 class InvestVehicle(BaseModel):
     ID: int
     NAME: str
@@ -96,63 +412,805 @@ class InvestmentUnit(BaseModel):
 class PricesRequest(BaseModel):
     symbols: List[str]
     key: Optional[str] = None 
-    
-def query_oracle(sql_query: str):
-    headers = {
-        "Content-Type": "application/sql",
-        "Authorization": "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
-    }
 
-    response = requests.post(ORACLE_URL, headers=headers, data=sql_query)
+################# Metrics ##############################
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
 
-    if not response.ok:
-        raise HTTPException(status_code=response.status_code, detail=response.text)
+def label_text(names: Tuple[str, ...], values: tuple) -> str:
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return ",".join(f'{n}="{v}"' for n, v in zip(names, escaped))
 
+class Histogram:
+    """
+    Prometheus-style histogram, one series per label-value tuple. Thread-safe
+    (Yahoo timings are observed from worker threads).
+    """
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...], buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[tuple, list] = {}  # labels -> per-bucket counts, then count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0, 0.0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for label_values, counts in sorted(series.items()):
+            labels = label_text(self.labels, label_values)
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {counts[-2]}')
+            lines.append(f"{self.name}_count{{{labels}}} {counts[-2]}")
+            lines.append(f"{self.name}_sum{{{labels}}} {round(counts[-1], 6)}")
+        return lines
+
+class Gauge:
+    """Up/down count per label-value tuple (in-flight requests)."""
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, amount: float, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{{{label_text(self.labels, label_values)}}} {value}")
+        return lines
+
+request_seconds = Histogram("http_request_duration_seconds", "Request latency by route.", ("method", "route", "status"), LATENCY_BUCKETS)
+response_bytes = Histogram("http_response_size_bytes", "Response body size on the wire by route.", ("method", "route"), SIZE_BUCKETS)
+requests_in_flight = Gauge("http_requests_in_flight", "Requests being handled by route.", ("method", "route"))
+upstream_seconds = Histogram("upstream_request_duration_seconds", "Upstream call latency (hedges and retries included) by upstream and call.", ("upstream", "call", "outcome"), LATENCY_BUCKETS)
+upstreams_in_flight = Gauge("upstream_requests_in_flight", "Upstream calls in progress.", ("upstream", "call"))
+yahoo_call_seconds = Histogram("yahoo_call_duration_seconds", "Latency of individual yfinance calls by type.", ("call",), LATENCY_BUCKETS)
+
+# Upstream seconds spent on behalf of the current request, by upstream name;
+# set per request by the timing middleware, None outside a request
+request_upstream_time: contextvars.ContextVar = contextvars.ContextVar("request_upstream_time", default=None)
+
+@contextmanager
+def yahoo_timer(call: str):
+    """Time one yfinance call (info, fast_info, history, download)."""
+    started = monotonic()
     try:
-        data = response.json()
-        return data["items"][0]["resultSet"]["items"]
-    except (KeyError, IndexError, TypeError):
-        raise HTTPException(status_code=500, detail=data)
-        
+        yield
+    finally:
+        yahoo_call_seconds.observe(monotonic() - started, call)
+
+@lru_cache(maxsize=512)
+def query_name(sql_query: str) -> str:
+    """The *_query setting a statement was built from, for metric labels."""
+    for name, base_query in sorted(settings.queries.items(), key=lambda item: -len(item[1])):
+        if sql_query == base_query or sql_query.startswith(base_query + " WHERE "):
+            return name
+    return "adhoc"
+
+def url_name(url: str) -> str:
+    """The *_URL setting a handler URL came from, for metric labels."""
+    for name, value in settings.urls.items():
+        if value == url:
+            return name
+    return "adhoc"
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """
+    Per-route latency, size and in-flight metrics, plus a Server-Timing
+    header splitting the request into upstream time (per upstream) and the
+    app's own time. Upstream calls run concurrently, so app time is the
+    wall time not covered by their sum, floored at zero.
+    """
+    started = monotonic()
+    upstream_time: Dict[str, float] = {}
+    request_upstream_time.set(upstream_time)
+    # route templates are only known after routing; the raw path would blow up label cardinality
+    in_flight_route = request.url.path if request.url.path in ROUTE_PATHS else "unmatched"
+    requests_in_flight.add(1, request.method, in_flight_route)
+    try:
+        response = await call_next(request)
+    finally:
+        requests_in_flight.add(-1, request.method, in_flight_route)
+    elapsed = monotonic() - started
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    request_seconds.observe(elapsed, request.method, route, str(response.status_code))
+    if response.headers.get("content-length"):
+        response_bytes.observe(int(response.headers["content-length"]), request.method, route)
+    upstream_total = sum(upstream_time.values())
+    timings = [f"{name.lower()};dur={seconds * 1000:.1f}" for name, seconds in upstream_time.items()]
+    timings.append(f"app;dur={max(0.0, elapsed - upstream_total) * 1000:.1f}")
+    timings.append(f"total;dur={elapsed * 1000:.1f}")
+    response.headers["Server-Timing"] = ", ".join(timings)
+    return response
+
+################# Upstream resilience ##############################
+
+def percentile(samples, q: float) -> float:
+    """Nearest-rank percentile; kept off numpy so ORDS calls never import it."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+def is_upstream_failure(e: Exception) -> bool:
+    """
+    Timeouts, transport errors and 5xx count against an upstream. Anything
+    else (4xx, or a KeyError/ValueError from parsing one bad symbol's data)
+    is the caller's problem and must not trip the breaker for everyone.
+    """
+    if isinstance(e, HTTPException):
+        return e.status_code >= 500
+    return isinstance(e, (asyncio.TimeoutError, httpx.TransportError, OSError))
+
+class Upstream:
+    """
+    Failure isolation for one upstream (ORDS, Yahoo). Every read goes
+    through call(), which gives it:
+      - a deadline (504 when exceeded),
+      - a hedge: a duplicate attempt once the first has run longer than the
+        recent HEDGE_PERCENTILE latency for that call type; first success wins,
+      - a circuit breaker: after BREAKER_FAILURES consecutive failures calls
+        fail fast with 503 for BREAKER_RESET seconds, then one trial call
+        decides whether to close it again.
+    Only used from the event loop, so no locking.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.hedge_tokens = 1.0
+        self.hedges = 0
+        self.latencies: Dict[str, deque] = {}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if monotonic() - self.opened_at < BREAKER_RESET:
+            return "open"
+        return "half-open"
+
+    def _admit(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self.trial_in_flight):
+            retry_in = max(0, int(BREAKER_RESET - (monotonic() - self.opened_at)))
+            raise HTTPException(status_code=503, detail=f"{self.name} unavailable (circuit open, retry in {retry_in}s)")
+        if state == "half-open":
+            self.trial_in_flight = True
+
+    def _record(self, op: str, elapsed: float, error: Exception = None):
+        self.trial_in_flight = False
+        if error is not None and is_upstream_failure(error):
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= BREAKER_FAILURES:
+                if self.opened_at is None:
+                    logger.warning(f"{self.name}: circuit opened after {self.failures} failures")
+                self.opened_at = monotonic()
+            return
+        if self.opened_at is not None:
+            logger.info(f"{self.name}: circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self.latencies.setdefault(op, deque(maxlen=LATENCY_WINDOW)).append(elapsed)
+
+    def hedge_delay(self, op: str) -> Optional[float]:
+        samples = self.latencies.get(op)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY, percentile(samples, HEDGE_PERCENTILE))
+
+    async def _hedged(self, op: str, make_call):
+        delay = self.hedge_delay(op)
+        first = asyncio.ensure_future(make_call())
+        pending = {first}
+        try:
+            if delay is None or self.hedge_tokens < 1:
+                return await first
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                self.hedge_tokens -= 1
+                self.hedges += 1
+                pending.add(asyncio.ensure_future(make_call()))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, op: str, make_call, deadline: float, hedge: bool = False):
+        """
+        Run make_call() (a zero-argument coroutine factory) under this
+        upstream's breaker and deadline. Only pass hedge=True for reads that
+        are safe to send twice.
+        """
+        self._admit()
+        self.hedge_tokens = min(10.0, self.hedge_tokens + HEDGE_BUDGET)
+        started = monotonic()
+        outcome = "error"
+        upstreams_in_flight.add(1, self.name, op)
+        try:
+            if hedge:
+                result = await asyncio.wait_for(self._hedged(op, make_call), deadline)
+            else:
+                result = await asyncio.wait_for(make_call(), deadline)
+            outcome = "ok"
+        except asyncio.TimeoutError as e:
+            outcome = "timeout"
+            self._record(op, monotonic() - started, e)
+            raise HTTPException(status_code=504, detail=f"{self.name} {op} timed out after {deadline}s")
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            self.trial_in_flight = False
+            raise
+        except Exception as e:
+            self._record(op, monotonic() - started, e)
+            raise
+        finally:
+            elapsed = monotonic() - started
+            self._observe(op, elapsed, outcome)
+        self._record(op, elapsed)
+        return result
+
+    async def timed(self, op: str, make_call):
+        """
+        Run make_call() with metrics and Server-Timing accounting only: no
+        breaker, deadline or hedge. For writes and other calls that must
+        not be duplicated or failed fast.
+        """
+        started = monotonic()
+        outcome = "error"
+        upstreams_in_flight.add(1, self.name, op)
+        try:
+            result = await make_call()
+            outcome = "ok"
+            return result
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            self._observe(op, monotonic() - started, outcome)
+
+    def _observe(self, op: str, elapsed: float, outcome: str):
+        upstreams_in_flight.add(-1, self.name, op)
+        upstream_seconds.observe(elapsed, self.name, op, outcome)
+        upstream_time = request_upstream_time.get()
+        if upstream_time is not None:
+            upstream_time[self.name] = upstream_time.get(self.name, 0.0) + elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutiveFailures": self.failures,
+            "hedges": self.hedges,
+            "latency": {
+                op: {
+                    "samples": len(samples),
+                    "p50": round(percentile(samples, 50), 4),
+                    "p95": round(percentile(samples, 95), 4),
+                    "hedgeAfter": self.hedge_delay(op),
+                }
+                for op, samples in self.latencies.items() if samples
+            },
+        }
+
+ords_upstream = Upstream("ORDS")
+yahoo_upstream = Upstream("Yahoo")
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in
+    flight, later callers await the same task instead of starting their
+    own, and all of them get its result or its exception. Nothing is kept
+    once the call finishes, so this is not a cache. Waiters are shielded,
+    so one client disconnecting does not cancel the call for the others.
+    """
+    def __init__(self):
+        self.shared = 0
+        self._calls: Dict[Any, asyncio.Future] = {}
+
+    async def do(self, key, make_call):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make_call())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+query_flight = SingleFlight()
+quote_flight = SingleFlight()
+
+@lru_cache(maxsize=256)
+def build_query(base_query: str, predicates: Tuple[str, ...] = ()) -> str:
+    """
+    Statement text for a base query plus AND-ed predicates. Predicates carry
+    bind placeholders (:name), never values, so each filter shape maps to one
+    fixed SQL text that Oracle parses once and shares; the text itself is
+    cached here per shape.
+    """
+    if not predicates:
+        return base_query
+    return f"{base_query} WHERE " + " AND ".join(predicates)
+
+def ords_binds(binds: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Bind values in the shape ORDS REST-enabled SQL expects."""
+    return [{"name": name, "data_type": "VARCHAR", "value": str(value)} for name, value in binds.items()]
+
+def load_json(body: bytes) -> Any:
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+def dump_json(payload: Any) -> bytes:
+    """
+    Compact UTF-8 JSON for response bodies. Uses orjson when installed, which
+    is several times faster than the stdlib on large row lists; datetimes
+    still go through str() so the output matches the json fallback.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            payload,
+            default=str,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+async def fetch_oracle_page(sql_query: str, offset: int, limit: int, binds: Dict[str, Any] = None, label: str = None):
+    """
+    Run one page of a query through ORDS REST-enabled SQL.
+    Returns (rows, has_more) straight from the resultSet. Reads are
+    hedged and bounded by ORDS_DEADLINE.
+    """
+    payload = {"statementText": sql_query, "offset": offset, "limit": limit}
+    if binds:
+        payload["binds"] = ords_binds(binds)
+
+    async def attempt():
+        try:
+            response = await ords_client.post(ORACLE_URL, headers=ORDS_JSON_HEADERS, json=payload)
+        except httpx.HTTPError as e:
+            logger.error(f"ORDS request failed: {e}")
+            raise HTTPException(status_code=500, detail=f"ORDS communication failed: {e}")
+
+        if not response.is_success:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+
+        try:
+            data = load_json(response.content)
+            result_set = data["items"][0]["resultSet"]
+            return result_set["items"], bool(result_set.get("hasMore"))
+        except (KeyError, IndexError, TypeError):
+            raise HTTPException(status_code=500, detail=data)
+
+    return await ords_upstream.call(label or query_name(sql_query), attempt, ORDS_DEADLINE, hedge=True)
+
+async def iter_oracle_pages(sql_query: str, page_size: int = None, binds: Dict[str, Any] = None):
+    """
+    Yield a query's rows page by page while ORDS reports hasMore. Pages are
+    keyed on ORDS_PAGE_KEY (ORDER BY it, then "> last key seen"), falling
+    back to offsets over the same ordering if a row comes back without it.
+    With ORDS_PREFETCH on, the next page is requested while the caller is
+    still handling the current one.
+    """
+    page_size = page_size or ORDS_PAGE_SIZE
+    label = query_name(sql_query)
+    binds = binds or {}
+    ordered, following = sql_query, None
+    if ORDS_PAGE_KEY:
+        ordered = f"SELECT * FROM ({sql_query}) ORDER BY {ORDS_PAGE_KEY}"
+        following = f"SELECT * FROM ({sql_query}) WHERE {ORDS_PAGE_KEY} > :page_after ORDER BY {ORDS_PAGE_KEY}"
+    offset = 0
+    pending = fetch_oracle_page(ordered, offset, page_size, binds, label)
+    try:
+        while pending is not None:
+            rows, has_more = await pending
+            pending = None
+            offset += len(rows)
+            if has_more and rows:
+                last_key = row_value(rows[-1], ORDS_PAGE_KEY) if following else None
+                if last_key is None:
+                    pending = fetch_oracle_page(ordered, offset, page_size, binds, label)
+                else:
+                    pending = fetch_oracle_page(following, 0, page_size, {**binds, "page_after": last_key}, label)
+                if ORDS_PREFETCH:
+                    pending = asyncio.ensure_future(pending)
+            yield rows
+    finally:
+        if asyncio.isfuture(pending):
+            pending.cancel()
+        elif pending is not None:
+            pending.close()
+
+async def query_oracle(sql_query: str, binds: Dict[str, Any] = None):
+    """
+    All rows of a query. Concurrent calls with the same SQL and binds share
+    one ORDS fetch (and so the same row list, which callers must not mutate).
+    """
+    async def fetch_all():
+        rows = []
+        async for page in iter_oracle_pages(sql_query, binds=binds):
+            rows.extend(page)
+        return rows
+
+    key = (sql_query, tuple(sorted((binds or {}).items())))
+    return await query_flight.do(key, fetch_all)
+
+def row_value(row: Dict[str, Any], column: str):
+    """ORDS may hand back column names upper- or lower-cased; accept either."""
+    if column in row:
+        return row[column]
+    return row.get(column.lower())
+
+def parse_stamp(value: Any) -> Optional[datetime]:
+    """
+    ISO-8601 timestamp (trailing Z or offset allowed) as a naive UTC
+    datetime; None when it does not parse.
+    """
+    try:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(pytz.utc).replace(tzinfo=None)
+    return ts
+
+def since_filter(since: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    SQL predicate and bind for delta sync: rows whose DELTA_COLUMN is after
+    the given ISO-8601 watermark. The value is parsed and re-formatted so
+    ORDS always gets one timestamp layout. Aware timestamps are taken as UTC.
+    """
+    ts = parse_stamp(since)
+    if ts is None:
+        raise HTTPException(status_code=400, detail="since must be an ISO-8601 timestamp")
+    return f"{DELTA_COLUMN} > TO_TIMESTAMP(:since, 'YYYY-MM-DD HH24:MI:SS.FF6')", {"since": ts.strftime('%Y-%m-%d %H:%M:%S.%f')}
+
+def delta_response(rows: List[Dict[str, Any]], since: str) -> Dict[str, Any]:
+    """
+    Wrap a delta result with the new high-water mark, which clients send
+    back as the next `since`: the latest DELTA_COLUMN returned (compared as
+    timestamps), but never later than DELTA_LOOKBACK seconds ago, so a row
+    committed late with an older stamp is still picked up. Rows in that
+    window come back on the next poll too; they are keyed by ID. Soft-deleted
+    rows (DELETEYN='Y') are included so devices can apply them as tombstones.
+    """
+    return {"count": len(rows), "watermark": delta_watermark(rows, since), "items": rows}
+
+def delta_watermark(rows: List[Dict[str, Any]], since: Optional[str]) -> Optional[str]:
+    """The next since= after `rows` were read past `since` (see delta_response)."""
+    stamps = [ts for ts in (parse_stamp(row_value(r, DELTA_COLUMN)) for r in rows) if ts]
+    if not stamps:
+        return since
+    watermark = min(max(stamps), datetime.utcnow() - timedelta(seconds=DELTA_LOOKBACK))
+    if since:
+        watermark = max(parse_stamp(since), watermark)
+    return watermark.isoformat() + "Z"
+
+################# Caching ##############################
+
+MISSING = object()
+
+class TTLCache:
+    """
+    In-process LRU cache with a TTL per entry. Entries can carry a tag so a
+    write can evict everything derived from one dataset. Thread-safe, since
+    the Yahoo path runs in worker threads.
+
+    Each tag has a generation, bumped by invalidate(). A loader reads it
+    before querying and passes it to set(), which drops the value if the tag
+    was invalidated in between, so a read that raced a write cannot put the
+    pre-write rows back.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()  # key -> (expires_at, tag, value)
+        self._generations: Dict[Any, int] = {}
+        self._clears = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= monotonic():
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def get_stale(self, key):
+        """The entry's value even if expired (not counted as a hit), for use while an upstream is down."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return MISSING if entry is None else entry[2]
+
+    def generation(self, tag: Any) -> int:
+        with self._lock:
+            return self._clears + self._generations.get(tag, 0)
+
+    def set(self, key, value, ttl: float, tag: Any = None, generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and generation != self._clears + self._generations.get(tag, 0):
+                return
+            self._entries[key] = (monotonic() + ttl, tag, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tag: Any):
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+            for k in [k for k, entry in self._entries.items() if entry[1] == tag]:
+                del self._entries[k]
+
+    def clear(self):
+        """Evict every entry and move every tag's generation on."""
+        with self._lock:
+            self._clears += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+query_cache = TTLCache(QUERY_CACHE_MAX_ENTRIES)
+
+def query_cache_key(sql_query: str, binds: Dict[str, Any] = None):
+    return (sql_query, tuple(sorted((binds or {}).items())))
+
+async def cached_query(dataset: str, sql_query: str, binds: Dict[str, Any] = None):
+    """
+    Read-through cache over query_oracle for reference datasets, keyed by
+    the SQL text plus its bind values and tagged with the dataset's env name
+    so the matching update* handler can evict it. If ORDS is failing, an
+    expired entry is served rather than an error.
+    """
+    cache_key = query_cache_key(sql_query, binds)
+    rows = query_cache.get(cache_key)
+    if rows is MISSING:
+        generation = query_cache.generation(dataset)
+        try:
+            rows = await query_oracle(sql_query, binds)
+        except HTTPException as e:
+            rows = query_cache.get_stale(cache_key)
+            if e.status_code < 500 or rows is MISSING:
+                raise
+            logger.warning(f"Serving stale {dataset}: {e.detail}")
+            return rows
+        query_cache.set(cache_key, rows, REFERENCE_CACHE_TTLS[dataset], tag=dataset, generation=generation)
+    return rows
+
+def columnar_rows(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Rows as one array per column under a single column-name header. A column
+    of strings with many repeats (dates, DELETEYN/TOSYNC/POSTSTATUS flags,
+    venues) is dictionary-encoded: its array holds indexes into
+    dictionaries[column], nulls stay null.
+    """
+    columns = list(dict.fromkeys(k for row in rows for k in row))
+    values = []
+    dictionaries = {}
+    for column in columns:
+        data = [row.get(column) for row in rows]
+        if all(v is None or isinstance(v, str) for v in data):
+            distinct = sorted({v for v in data if v is not None})
+            if distinct and len(distinct) * 2 <= len(data):
+                index = {v: i for i, v in enumerate(distinct)}
+                data = [None if v is None else index[v] for v in data]
+                dictionaries[column] = distinct
+        values.append(data)
+    return {"columns": columns, "rowCount": len(rows), "values": values, "dictionaries": dictionaries}
+
+def to_columnar(payload: Any) -> Any:
+    """
+    Convert every list of rows in a payload (plain, delta or bootstrap shape)
+    to columnar_rows. An empty list is a list of no rows, so it gets the same
+    shape.
+    """
+    if isinstance(payload, list) and all(isinstance(row, dict) for row in payload):
+        return columnar_rows(payload)
+    if isinstance(payload, dict):
+        return {k: to_columnar(v) for k, v in payload.items()}
+    return payload
+
+def list_response(request: Request, payload: Any) -> Response:
+    """
+    Encode a list endpoint's result with an ETag (hash of the body). If the
+    client's If-None-Match already holds that tag, answer 304 with no body
+    so unchanged data is never re-sent. Large bodies are brotli compressed
+    here when the client accepts it, under a strong "-br" tag; otherwise
+    GZipMiddleware may gzip them after the tag is set, so those get a weak
+    W/ tag, valid for either encoding. If-None-Match is compared weakly.
+
+    ?format=columnar returns the rows column-wise (see columnar_rows);
+    ?format=msgpack is the same layout as MessagePack.
+    """
+    return send_list(request, *encode_list(request, payload))
+
+def encode_list(request: Request, payload: Any) -> Tuple[bytes, str, str, bool]:
+    """(body, media type, ETag, brotli?) for list_response; the body is not compressed yet."""
+    fmt = request.query_params.get("format")
+    if fmt in ("columnar", "msgpack"):
+        payload = to_columnar(payload)
+    elif fmt not in (None, "json"):
+        raise HTTPException(status_code=400, detail="format must be 'json', 'columnar' or 'msgpack'")
+    if fmt == "msgpack":
+        if msgpack is None:
+            raise HTTPException(status_code=400, detail="msgpack format is not available on this server")
+        body = msgpack.packb(payload, default=str, use_bin_type=True)
+        media_type = "application/msgpack"
+    else:
+        body = dump_json(payload)
+        media_type = "application/json"
+    use_brotli = (
+        brotli is not None
+        and len(body) >= COMPRESS_MIN_SIZE
+        and "br" in request.headers.get("Accept-Encoding", "")
+    )
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + ("-br" if use_brotli else "") + '"'
+    if len(body) >= COMPRESS_MIN_SIZE and not use_brotli:
+        etag = "W/" + etag
+    return body, media_type, etag, use_brotli
+
+def send_list(request: Request, body: bytes, media_type: str, etag: str, use_brotli: bool) -> Response:
+    headers = {"ETag": etag}
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        if "*" in tags or etag.removeprefix("W/") in tags:
+            return Response(status_code=304, headers=headers)
+    if use_brotli:
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+        headers.update({"Content-Encoding": "br", "Vary": "Accept-Encoding"})
+    return Response(content=body, media_type=media_type, headers=headers)
+
+# Encoded list bodies for cached_query datasets, one per query, format and
+# brotli acceptance; an entry is only used while its rows are still the
+# ones query_cache holds
+encoded_cache = TTLCache(QUERY_CACHE_MAX_ENTRIES)
+
+async def cached_list_response(request: Request, dataset: str, sql_query: str, binds: Dict[str, Any] = None) -> Response:
+    """list_response over cached_query, re-encoding (and hashing) only when the cached rows change."""
+    rows = await cached_query(dataset, sql_query, binds)
+    accepts_br = "br" in request.headers.get("Accept-Encoding", "")
+    cache_key = (query_cache_key(sql_query, binds), request.query_params.get("format"), accepts_br)
+    entry = encoded_cache.get(cache_key)
+    if entry is MISSING or entry[0] is not rows:
+        entry = (rows, encode_list(request, rows))
+        encoded_cache.set(cache_key, entry, REFERENCE_CACHE_TTLS[dataset])
+    return send_list(request, *entry[1])
+
+async def stream_response(sql_query: str, fmt: str, binds: Dict[str, Any] = None) -> StreamingResponse:
+    """
+    Stream a query page by page as NDJSON (one row per line) or as a chunked
+    JSON array, so the first rows go out before the last page is fetched and
+    memory stays at roughly one page. The first page is fetched up front so
+    an ORDS failure still surfaces as a normal error status.
+    """
+    if fmt not in ("ndjson", "json"):
+        raise HTTPException(status_code=400, detail="stream must be 'ndjson' or 'json'")
+    pages = iter_oracle_pages(sql_query, binds=binds)
+    first_page = await anext(pages, [])
+
+    async def body():
+        try:
+            if fmt == "json":
+                yield b"["
+            first_row = True
+            page = first_page
+            while True:
+                chunk = []
+                for row in page:
+                    encoded = dump_json(row)
+                    if fmt == "ndjson":
+                        chunk.append(encoded + b"\n")
+                    else:
+                        chunk.append(encoded if first_row else b"," + encoded)
+                    first_row = False
+                if chunk:
+                    yield b"".join(chunk)
+                page = await anext(pages, None)
+                if page is None:
+                    break
+            if fmt == "json":
+                yield b"]"
+        finally:
+            await pages.aclose()
+
+    media_type = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return StreamingResponse(body(), media_type=media_type)
+
 from fastapi import Query
 ################# Get rows ##############################
 @app.get("/expenses")
-def get_expenses(request: Request, key: str = Query(None), categoryid: str = Query(None), venueFound: str = Query(None)):
+async def get_expenses(request: Request, key: str = Query(None), categoryid: str = Query(None), venueFound: str = Query(None), since: str = Query(None), stream: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    base_query = os.environ["transactions_query"]
+    base_query = settings.query("transactions_query")
     filters = []
+    binds = {}
 
     if categoryid:
         filters.append("cardcategory is not null")
     if venueFound:
-        filters.append(f"venuefound = '{venueFound}'")
-        
-    if filters:
-        sql_query = f"{base_query} WHERE " + " AND ".join(filters)
-    else:
-        sql_query = base_query
-
-    return query_oracle(sql_query)
+        filters.append("venuefound = :venuefound")
+        binds["venuefound"] = venueFound
+    if since:
+        predicate, since_binds = since_filter(since)
+        filters.append(predicate)
+        binds.update(since_binds)
+
+    sql_query = build_query(base_query, tuple(filters))
+
+    if stream:
+        return await stream_response(sql_query, stream, binds)
+    if since:
+        return list_response(request, delta_response(await query_oracle(sql_query, binds), since))
+    # Plain reads come from the warm copy, with the same filters applied here
+    rows = await transactions_frame.rows()
+    if categoryid:
+        rows = [r for r in rows if row_value(r, "CARDCATEGORY") is not None]
+    if venueFound:
+        rows = [r for r in rows if row_value(r, "VENUEFOUND") == venueFound]
+    return list_response(request, rows)
 
 @app.get("/cards")
-def get_cards(
+async def get_cards(
     request: Request,
     key: str = Query(None),
     cardNo: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden") 
-    base_query = os.environ["cards_query"]
+    base_query = settings.query("cards_query")
     if cardNo:
-        sql_query = f"{base_query} WHERE CARDNO = '{cardNo}'"
-    else:
-        sql_query = base_query
-    return query_oracle(sql_query)
+        return await cached_list_response(request, "cards_query", build_query(base_query, ("CARDNO = :cardno",)), {"cardno": cardNo})
+    return await cached_list_response(request, "cards_query", base_query)
 
 @app.get("/venueMapping")
-def get_venue(
+async def get_venue(
     request: Request,
     key: str = Query(None),
     cardNo: str = Query(None),
@@ -162,218 +1220,745 @@ def get_venue(
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    base_query = os.environ["venue_mapping_query"]
+    base_query = settings.query("venue_mapping_query")
 
     filters = []
+    binds = {}
 
     if cardNo:
-        filters.append(f"CardId = '{cardNo}'")
+        filters.append("CardId = :cardid")
+        binds["cardid"] = cardNo
     if venue:
-        filters.append(f"VENUE = '{venue}'")
+        filters.append("VENUE = :venue")
+        binds["venue"] = venue
 
-    if filters:
-        sql_query = f"{base_query} WHERE " + " AND ".join(filters)
-    else:
-        sql_query = base_query
+    sql_query = build_query(base_query, tuple(filters))
 
-    return query_oracle(sql_query)
+    return await cached_list_response(request, "venue_mapping_query", sql_query, binds)
 
 
 @app.get("/categories")
-def get_categories(request: Request, key: str = Query(None)):
+async def get_categories(request: Request, key: str = Query(None), since: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    SQL_QUERY = os.environ["category_query"]
-    return query_oracle(SQL_QUERY)
+    SQL_QUERY = settings.query("category_query")
+    if since:
+        predicate, binds = since_filter(since)
+        return list_response(request, delta_response(await query_oracle(build_query(SQL_QUERY, (predicate,)), binds), since))
+    return await cached_list_response(request, "category_query", SQL_QUERY)
 
 @app.get("/cardcategories")
-def get_cardcategories(request: Request, key: str = Query(None), categoryid = Query(None)):
+async def get_cardcategories(request: Request, key: str = Query(None), categoryid = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    base_query = os.environ["card_category_query"]
+    base_query = settings.query("card_category_query")
     if categoryid:
-        sql_query = f"{base_query} WHERE ID = '{categoryid}'"
-    else:
-        sql_query = base_query
-    return query_oracle(sql_query)
+        return await cached_list_response(request, "card_category_query", build_query(base_query, ("ID = :categoryid",)), {"categoryid": categoryid})
+    return await cached_list_response(request, "card_category_query", base_query)
 
 @app.get("/recurExpenses")
-def get_recurExpenses(request: Request, key: str = Query(None)):
+async def get_recurExpenses(request: Request, key: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    SQL_QUERY = os.environ["recur_expense_query"]
-    return query_oracle(SQL_QUERY)
+    SQL_QUERY = settings.query("recur_expense_query")
+    return list_response(request, await query_oracle(SQL_QUERY))
 
 @app.get("/rewardCategoryLimits")
-def get_rewardCategoryLimits(request: Request, key: str = Query(None)):
+async def get_rewardCategoryLimits(request: Request, key: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    SQL_QUERY = os.environ["reward_category_limit_query"]
-    return query_oracle(SQL_QUERY)
+    SQL_QUERY = settings.query("reward_category_limit_query")
+    return await cached_list_response(request, "reward_category_limit_query", SQL_QUERY)
 
 @app.get("/cardCategoryLimits")
-def get_cardCategoryLimit(request: Request, key: str = Query(None)):
+async def get_cardCategoryLimit(request: Request, key: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    SQL_QUERY = os.environ["card_category_limit_query"]
-    return query_oracle(SQL_QUERY)
+    SQL_QUERY = settings.query("card_category_limit_query")
+    return await cached_list_response(request, "card_category_limit_query", SQL_QUERY)
 
 @app.get("/cardCycles")
-def get_cardCycles(request: Request, key: str = Query(None)):
+async def get_cardCycles(request: Request, key: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    SQL_QUERY = os.environ["card_cycles_query"]
-    return query_oracle(SQL_QUERY)
+    SQL_QUERY = settings.query("card_cycles_query")
+    return await cached_list_response(request, "card_cycles_query", SQL_QUERY)
 
 @app.get("/rewardLimitData")
-def get_expenses(request: Request, key: str = Query(None)):
+async def get_expenses(request: Request, key: str = Query(None), since: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    SQL_QUERY = os.environ["reward_limit_query"]
-    return query_oracle(SQL_QUERY)
+    SQL_QUERY = settings.query("reward_limit_query")
+    if since:
+        predicate, binds = since_filter(since)
+        return list_response(request, delta_response(await query_oracle(build_query(SQL_QUERY, (predicate,)), binds), since))
+    return list_response(request, await query_oracle(SQL_QUERY))
 
 @app.get("/rewardCategoryLimitData")
-def get_expenses(request: Request, key: str = Query(None)):
+async def get_expenses(request: Request, key: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    SQL_QUERY = os.environ["reward_category_limit_usage_query"]
-    return query_oracle(SQL_QUERY)
+    SQL_QUERY = settings.query("reward_category_limit_usage_query")
+    return list_response(request, await query_oracle(SQL_QUERY))
 
 @app.get("/investmentVehData")
-def investment_veh_data(request: Request, key: str = Query(None)):
+async def investment_veh_data(request: Request, key: str = Query(None), since: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    SQL_QUERY = os.environ["investment_veh_query"]
-    return query_oracle(SQL_QUERY)
+    SQL_QUERY = settings.query("investment_veh_query")
+    if since:
+        predicate, binds = since_filter(since)
+        return list_response(request, delta_response(await query_oracle(build_query(SQL_QUERY, (predicate,)), binds), since))
+    return list_response(request, await query_oracle(SQL_QUERY))
 
 @app.get("/investmentUnitData")
-def investment_unit_data(request: Request, key: str = Query(None)):
+async def investment_unit_data(request: Request, key: str = Query(None), since: str = Query(None)):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    SQL_QUERY = settings.query("investment_unit_query")
+    if since:
+        predicate, binds = since_filter(since)
+        return list_response(request, delta_response(await query_oracle(build_query(SQL_QUERY, (predicate,)), binds), since))
+    return list_response(request, await query_oracle(SQL_QUERY))
+
+################# Bootstrap ##############################
+
+# dataset name (same as its GET endpoint) -> env var holding its SQL
+BOOTSTRAP_DATASETS = {
+    "expenses": "transactions_query",
+    "cards": "cards_query",
+    "categories": "category_query",
+    "cardcategories": "card_category_query",
+    "cardCycles": "card_cycles_query",
+    "venueMapping": "venue_mapping_query",
+    "recurExpenses": "recur_expense_query",
+    "rewardCategoryLimits": "reward_category_limit_query",
+    "cardCategoryLimits": "card_category_limit_query",
+    "rewardLimitData": "reward_limit_query",
+    "rewardCategoryLimitData": "reward_category_limit_usage_query",
+    "investmentVehData": "investment_veh_query",
+    "investmentUnitData": "investment_unit_query",
+}
+
+async def load_dataset(query_env: str):
+    """Rows for one configured *_query, through the reference cache or the warm transactions."""
+    sql_query = settings.query(query_env)
+    if query_env in REFERENCE_CACHE_TTLS:
+        return await cached_query(query_env, sql_query)
+    if query_env == "transactions_query":
+        return await transactions_frame.rows()
+    return await query_oracle(sql_query)
+
+@app.get("/bootstrap")
+async def bootstrap(request: Request, key: str = Query(None), datasets: str = Query(None)):
+    """
+    Everything the app loads at start in one response, with all queries run
+    concurrently so cold start costs the slowest query, not the sum.
+    ?datasets=cards,categories picks a subset (default: all). A failing
+    dataset is reported under "errors" without failing the others.
+    """
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    SQL_QUERY = os.environ["investment_unit_query"]
-    return query_oracle(SQL_QUERY)
-
-################# Get IDs ##############################
 
-@app.get("/get-expense-id")
-def get_expense_id(request: Request, key: str = Query(None)):
+    names = [d.strip() for d in datasets.split(",") if d.strip()] if datasets else list(BOOTSTRAP_DATASETS)
+    unknown = [n for n in names if n not in BOOTSTRAP_DATASETS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown datasets: {', '.join(unknown)}")
+
+    results = await asyncio.gather(
+        *(load_dataset(BOOTSTRAP_DATASETS[n]) for n in names), return_exceptions=True
+    )
+    payload = {"datasets": {}, "errors": {}}
+    for name, result in zip(names, results):
+        if isinstance(result, HTTPException):
+            payload["errors"][name] = {"status": result.status_code, "detail": result.detail}
+        elif isinstance(result, Exception):
+            payload["errors"][name] = {"status": 500, "detail": str(result)}
+        else:
+            payload["datasets"][name] = result
+    return list_response(request, payload)
+
+################# Recurring expenses ##############################
+
+# FREQUENCY -> (unit, step): "M" steps whole months (RECUR_DAY clamped to
+# month end), "D" steps days from START_DATE
+RECUR_FREQUENCIES = {
+    "DAILY": ("D", 1),
+    "WEEKLY": ("D", 7),
+    "BIWEEKLY": ("D", 14),
+    "FORTNIGHTLY": ("D", 14),
+    "MONTHLY": ("M", 1),
+    "QUARTERLY": ("M", 3),
+    "YEARLY": ("M", 12),
+    "ANNUALLY": ("M", 12),
+}
+
+def expand_groups(counts: "np.ndarray"):
+    """For per-rule counts [2, 3] return owners [0, 0, 1, 1, 1] and offsets [0, 1, 0, 1, 2]."""
+    owners = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, offsets
+
+def due_occurrences(rules: "pd.DataFrame", as_of: "np.datetime64") -> "pd.DataFrame":
+    """
+    Every occurrence due after LAST_GEN_DT (or from START_DATE) up to and
+    including as_of, for all rules at once: one numpy expansion per unit
+    instead of a date loop per rule. Returns RULE (row label in `rules`)
+    and DATE columns, ordered by rule then date.
+    """
+    start = pd.to_datetime(rules["START_DATE"], errors="coerce").values.astype("datetime64[D]")
+    last = pd.to_datetime(rules["LAST_GEN_DT"], errors="coerce").values.astype("datetime64[D]")
+    freq = rules["FREQUENCY"].fillna("").str.strip().str.upper()
+    unit = freq.map(lambda f: RECUR_FREQUENCIES.get(f, (None, 0))[0]).values
+    step = freq.map(lambda f: RECUR_FREQUENCIES.get(f, (None, 0))[1]).values.astype(int)
+    recur_day = rules["RECUR_DAY"].values
+
+    frames = []
+
+    days = np.flatnonzero((unit == "D") & ~np.isnat(start) & (start <= as_of))
+    if len(days):
+        counts = (as_of - start[days]).astype(int) // step[days] + 1
+        owners, offsets = expand_groups(counts)
+        dates = start[days][owners] + (offsets * step[days][owners]).astype("timedelta64[D]")
+        frames.append(pd.DataFrame({"POS": days[owners], "DATE": dates}))
+
+    months = np.flatnonzero((unit == "M") & ~np.isnat(start) & (start <= as_of))
+    if len(months):
+        start_month = start[months].astype("datetime64[M]")
+        counts = (as_of.astype("datetime64[M]") - start_month).astype(int) // step[months] + 1
+        owners, offsets = expand_groups(counts)
+        month = start_month[owners] + (offsets * step[months][owners]).astype("timedelta64[M]")
+        month_days = ((month + 1).astype("datetime64[D]") - month.astype("datetime64[D]")).astype(int)
+        # RECUR_DAY missing -> the day of START_DATE
+        start_day = (start[months] - start_month.astype("datetime64[D]")).astype(int) + 1
+        wanted_day = np.where(np.isnan(recur_day[months].astype(float)), start_day, recur_day[months]).astype(int)
+        day = np.minimum(wanted_day[owners], month_days)
+        dates = month.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+        frames.append(pd.DataFrame({"POS": months[owners], "DATE": dates}))
+
+    if not frames:
+        return pd.DataFrame({"RULE": pd.Series(dtype=object), "DATE": pd.Series(dtype="datetime64[ns]")})
+    occ = pd.concat(frames, ignore_index=True)
+    pos = occ["POS"].values
+    due = (occ["DATE"].values >= start[pos]) & (occ["DATE"].values <= as_of)
+    due &= np.isnat(last[pos]) | (occ["DATE"].values > last[pos])
+    occ = occ[due].sort_values(["POS", "DATE"], kind="stable")
+    return pd.DataFrame({"RULE": rules.index.values[occ["POS"].values], "DATE": occ["DATE"].values})
+
+def occurrence_expense(rule: Dict[str, Any], expense_id: int, date: str, updated: str) -> Expense:
+    optional = {"BUDGETLABEL": rule.get("BUDGET_CATEGORY_ID"), "CARDCATEGORY": rule.get("CARD_CATEGORY_ID")}
+    return Expense(
+        ID=expense_id,
+        CARDID=int(rule["CARD_ID"]),
+        TRANSACTIONDATE=date,
+        DESCRIPTION=rule["DESCRIPTION"],
+        AMOUNT=rule["AMOUNT"],
+        POSTSTATUS=RECUR_POST_STATUS,
+        REWARDSVALUE=0,
+        VENUEFOUND="N",
+        TOSYNC="N",
+        DELETEYN="N",
+        UPDATEDDT=updated,
+        RECURYN="Y",
+        **{k: int(v) for k, v in optional.items() if v is not None},
+    )
+
+def rule_fields(rule: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: rule.get(k) for k in RecurExpense.model_fields if rule.get(k) is not None}
+
+async def upsert_with_retry(url: str, rows: List[Any], to_payload) -> List[Dict[str, Any]]:
+    """upsert_ords_batch, then one more try for the failed rows (same IDs, so the retry cannot duplicate)."""
+    results = (await upsert_ords_batch(url, rows, to_payload))["results"]
+    retry = [i for i, r in enumerate(results) if r["status"] != "success"]
+    if retry:
+        retried = await upsert_ords_batch(url, [rows[i] for i in retry], to_payload)
+        for i, result in zip(retry, retried["results"]):
+            results[i] = result
+    return results
+
+# One materialization at a time per process, so a double tap cannot write
+# the same occurrences twice
+materialize_lock = asyncio.Lock()
+
+@app.post("/materializeRecurExpenses")
+async def materialize_recur_expenses(
+    request: Request,
+    key: str = Query(None),
+    dryRun: bool = Query(False),
+    asOf: str = Query(None)
+):
+    """
+    Generate every expense due from the recurring rules since their
+    LAST_GEN_DT (up to asOf, default today) and advance LAST_GEN_DT.
+    dryRun=true only returns the preview.
+    """
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    ORDS_NEXT_ID_URL = os.environ["get_expense_url"]
+    # Runs are serialized in-process. A 502 lists rules whose LAST_GEN_DT
+    # could not be written ("unrecordedRules") and expenses that could not
+    # be rolled back ("orphaned"); fix those before rerunning, or the rerun
+    # duplicates them
+    async with materialize_lock:
+        return await materialize_due(dryRun, asOf)
+
+async def materialize_due(dryRun: bool, asOf: Optional[str]):
     try:
-        response = requests.get(ORDS_NEXT_ID_URL)
-
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
-
-        data = response.json()
+        as_of = np.datetime64(asOf or datetime.now().strftime("%Y-%m-%d"), "D")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="asOf must be YYYY-MM-DD")
+
+    rules = rows_frame(
+        await query_oracle(settings.query("recur_expense_query")),
+        numeric=("ID", "AMOUNT", "RECUR_DAY", "CARD_ID", "CARD_CATEGORY_ID", "BUDGET_CATEGORY_ID", "EXPENSE_ID"),
+    )
+    if rules.empty:
+        return {"dryRun": dryRun, "count": 0, "occurrences": [], "skipped": []}
+    if "DELETEYN" in rules.columns:
+        rules = rules[rules["DELETEYN"] != "Y"]
+
+    freq = rules["FREQUENCY"].fillna("").str.strip().str.upper()
+    skipped = [{"ID": r["ID"], "reason": f"Unsupported FREQUENCY '{r['FREQUENCY']}'"}
+               for r in frame_records(rules[~freq.isin(list(RECUR_FREQUENCIES))])]
+    skipped += [{"ID": r["ID"], "reason": "No CARD_ID"}
+                for r in frame_records(rules[freq.isin(list(RECUR_FREQUENCIES)) & rules["CARD_ID"].isna()])]
+    rules = rules[freq.isin(list(RECUR_FREQUENCIES)) & rules["CARD_ID"].notna()]
+
+    # Rules that could not be written back with a new LAST_GEN_DT are left
+    # alone entirely, otherwise every run would regenerate their expenses
+    records, writable = {}, []
+    for label, rule in zip(rules.index, frame_records(rules)):
+        fields = rule_fields(rule)
+        try:
+            RecurExpense(**{"LAST_GEN_DT": str(as_of), **fields})
+        except ValidationError as e:
+            problems = "; ".join(f"{err['loc'][0]}: {err['msg']}" for err in e.errors())
+            skipped.append({"ID": rule["ID"], "reason": f"Rule cannot be updated ({problems})"})
+            continue
+        records[label] = rule
+        writable.append(label)
+    rules = rules.loc[writable]
+
+    occ = due_occurrences(rules, as_of)
+    if len(occ) > ORDS_BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{len(occ)} occurrences due; at most {ORDS_BATCH_MAX_ROWS} per run, use asOf to catch up in steps",
+        )
+    occ["TRANSACTIONDATE"] = occ["DATE"].dt.strftime("%Y-%m-%d")
+    preview = [
+        {"RECUR_ID": int(records[label]["ID"]), "TRANSACTIONDATE": date, "DESCRIPTION": records[label]["DESCRIPTION"],
+         "AMOUNT": records[label]["AMOUNT"], "CARDID": int(records[label]["CARD_ID"])}
+        for label, date in zip(occ["RULE"], occ["TRANSACTIONDATE"])
+    ]
+    if dryRun or not preview:
+        return {"dryRun": dryRun, "count": len(preview), "occurrences": preview, "skipped": skipped}
+
+    updated = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+    ids = await id_allocators["expense"].take(len(preview))
+    expenses = [
+        occurrence_expense(records[label], expense_id, date, updated)
+        for label, expense_id, date in zip(occ["RULE"], ids, occ["TRANSACTIONDATE"])
+    ]
+    # Write in rounds of RECUR_WRITE_CHUNK dates per rule (every rule's 1st
+    # chunk, then 2nd, ...) and drop a rule from later rounds once a date
+    # fails, so LAST_GEN_DT can advance to exactly what was written
+    expense_url = settings.url("ORACLE_INSERT_EXPENSE_URL")
+    rule_of = occ["RULE"].values
+    rank = occ.groupby("RULE").cumcount().values
+    results: List[Any] = [{"status": "skipped"}] * len(expenses)
+    last_written, blocked = {}, set()
+    for first in range(0, int(rank.max()) + 1, RECUR_WRITE_CHUNK):
+        in_chunk = (rank >= first) & (rank < first + RECUR_WRITE_CHUNK)
+        batch = [i for i in np.flatnonzero(in_chunk) if rule_of[i] not in blocked]
+        if not batch:
+            break
+        for i, result in zip(batch, await upsert_with_retry(expense_url, [expenses[i] for i in batch], expense_payload)):
+            results[i] = result
+        # occ is ordered by rule then date, so batch is too
+        rollback = []
+        for i in batch:
+            if rule_of[i] in blocked:
+                if results[i]["status"] == "success":
+                    rollback.append(i)
+            elif results[i]["status"] == "success":
+                last_written[rule_of[i]] = occ["TRANSACTIONDATE"].iat[i]
+            else:
+                blocked.add(rule_of[i])
+        if rollback:
+            deleted = [expenses[i].model_copy(update={"DELETEYN": "Y"}) for i in rollback]
+            for i, result in zip(rollback, await upsert_with_retry(expense_url, deleted, expense_payload)):
+                if result["status"] == "success":
+                    results[i] = {"ID": expenses[i].ID, "status": "rolledBack"}
+                else:
+                    results[i] = {"ID": expenses[i].ID, "status": "orphaned", "error": result["error"]}
+    reward_cache.clear()
+    transactions_frame.invalidate()
+
+    advanced = [
+        (label, RecurExpense(**{**rule_fields(records[label]), "LAST_GEN_DT": date}))
+        for label, date in last_written.items()
+    ]
+    rule_results = (
+        await upsert_with_retry(settings.url("ORACLE_INSERT_RECUR_EXPENSE_URL"), [r for _, r in advanced], recur_expense_payload)
+        if advanced else []
+    )
+    unrecorded = [
+        {
+            "ID": rule.ID,
+            "LAST_GEN_DT": rule.LAST_GEN_DT,
+            "expenseIds": [expenses[i].ID for i in np.flatnonzero(rule_of == label) if results[i]["status"] == "success"],
+            "error": result.get("error"),
+        }
+        for (label, rule), result in zip(advanced, rule_results)
+        if result["status"] != "success"
+    ]
+
+    for o, expense, result in zip(preview, expenses, results):
+        o["ID"] = expense.ID
+        o["status"] = result["status"]
+        if "error" in result:
+            o["error"] = result["error"]
+    payload = {
+        "dryRun": False,
+        "count": len(preview),
+        "failed": sum(1 for r in results if r["status"] in ("error", "orphaned")),
+        "occurrences": preview,
+        "rules": rule_results,
+        "unrecordedRules": unrecorded,
+        "skipped": skipped,
+    }
+    if unrecorded or any(r["status"] == "orphaned" for r in results):
+        return Response(content=dump_json(payload), status_code=502, media_type="application/json")
+    return payload
 
-        # return just the ID field
-        return {"expense_id": data.get("id")}
+################# Analytics ##############################
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+# groupBy name -> transactions column
+ANALYTICS_GROUPS = {
+    "month": "MONTH",
+    "budget": "BUDGETLABEL",
+    "card": "CARDID",
+    "cardCategory": "CARDCATEGORY",
+}
 
-@app.get("/get-budget-id")
-def get_budget_id(request: Request, key: str = Query(None)):
+class TransactionFrame:
+    """
+    The transactions_query rows, kept warm for /expenses, plus a columnar
+    (pandas) copy of them for aggregate queries, built on first use;
+    soft-deleted rows are dropped from the copy only. Loaded in full at
+    first use, after an expense write invalidates it and every
+    TRANSACTIONS_FULL_RELOAD seconds. Otherwise a refresh (background, or
+    after TRANSACTIONS_FRAME_TTL) pulls only the rows since_filter finds
+    past the last watermark and merges them by ID. A load that an
+    invalidate() overtook is returned to its caller but not kept.
+    """
+    def __init__(self):
+        self._rows = None  # ID -> row, in load order
+        self._row_list = None
+        self._frame = None
+        self._watermark = None
+        self._loaded_at = 0.0
+        self._full_loaded_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def rows(self) -> List[Dict[str, Any]]:
+        async with self._lock:
+            if self._row_list is None or monotonic() - self._loaded_at > TRANSACTIONS_FRAME_TTL:
+                return await self._load()
+            return self._row_list
+
+    async def get(self) -> "pd.DataFrame":
+        async with self._lock:
+            if self._row_list is None or monotonic() - self._loaded_at > TRANSACTIONS_FRAME_TTL:
+                row_list = await self._load()
+                if row_list is not self._row_list:
+                    return self._prepare(row_list)
+            if self._frame is None:
+                self._frame = self._prepare(self._row_list)
+            return self._frame
+
+    async def refresh(self):
+        """Refresh now, whatever the age (used by the background scheduler), and rebuild the frame."""
+        async with self._lock:
+            await self._load()
+            if self._frame is None and self._row_list is not None:
+                self._frame = self._prepare(self._row_list)
+
+    async def _load(self) -> List[Dict[str, Any]]:
+        generation = self._generation
+        sql_query = settings.query("transactions_query")
+        full = self._watermark is None or monotonic() - self._full_loaded_at > TRANSACTIONS_FULL_RELOAD
+        if full:
+            fetched = await query_oracle(sql_query)
+            rows = {}
+        else:
+            predicate, binds = since_filter(self._watermark)
+            fetched = await query_oracle(build_query(sql_query, (predicate,)), binds)
+            rows = dict(self._rows)
+        keyed = True
+        for i, row in enumerate(fetched):
+            row_id = row_value(row, "ID")
+            if row_id is None:
+                # without IDs nothing can be merged, so every load stays a full one
+                keyed, row_id = False, ("row", i)
+            rows[row_id] = row
+        changed = full or bool(fetched)
+        row_list = list(rows.values()) if changed else self._row_list
+        if generation == self._generation:
+            self._rows = rows
+            self._row_list = row_list
+            self._watermark = delta_watermark(fetched, None if full else self._watermark) if keyed else None
+            self._loaded_at = monotonic()
+            if full:
+                self._full_loaded_at = self._loaded_at
+            if changed:
+                self._frame = None
+        return row_list
+
+    def invalidate(self):
+        self._generation += 1
+        self._rows = None
+        self._row_list = None
+        self._frame = None
+        self._watermark = None
+
+    @staticmethod
+    def _prepare(rows: List[Dict[str, Any]]) -> "pd.DataFrame":
+        df = rows_frame(rows, numeric=("AMOUNT", "REWARDSVALUE", "CARDID", "BUDGETLABEL", "CARDCATEGORY"))
+        for col in ("TRANSACTIONDATE", "AMOUNT", "REWARDSVALUE", "CARDID", "BUDGETLABEL", "CARDCATEGORY", "DELETEYN"):
+            if col not in df.columns:
+                df[col] = np.nan
+        df = df[df["DELETEYN"] != "Y"]
+        dates = pd.to_datetime(df["TRANSACTIONDATE"], errors="coerce", utc=True).dt.tz_localize(None).dt.normalize()
+        return pd.DataFrame({
+            "TRANSACTIONDATE": dates,
+            "MONTH": dates.dt.strftime("%Y-%m"),
+            "AMOUNT": df["AMOUNT"],
+            "REWARDSVALUE": df["REWARDSVALUE"],
+            "CARDID": df["CARDID"],
+            "BUDGETLABEL": df["BUDGETLABEL"],
+            "CARDCATEGORY": df["CARDCATEGORY"],
+        })
+
+transactions_frame = TransactionFrame()
+
+@app.get("/spendAnalytics")
+async def spend_analytics(
+    request: Request,
+    key: str = Query(None),
+    groupBy: str = Query("month"),
+    start: str = Query(None),
+    end: str = Query(None)
+):
+    """
+    Sum and count of AMOUNT and REWARDSVALUE per group, e.g.
+    /spendAnalytics?groupBy=month,card&start=2024-01-01&end=2024-12-31
+    groupBy: any of month, budget, card, cardCategory. start/end are
+    inclusive YYYY-MM-DD bounds on TRANSACTIONDATE.
+    """
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    ORDS_NEXT_ID_URL = os.environ["get_budget_id_url"]
+
+    groups = [g.strip() for g in groupBy.split(",") if g.strip()]
+    unknown = [g for g in groups if g not in ANALYTICS_GROUPS]
+    if not groups or unknown:
+        raise HTTPException(status_code=400, detail=f"groupBy must be a list of: {', '.join(ANALYTICS_GROUPS)}")
     try:
-        response = requests.get(ORDS_NEXT_ID_URL)
+        start_ts = pd.Timestamp(start) if start else None
+        end_ts = pd.Timestamp(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be YYYY-MM-DD")
+
+    df = await transactions_frame.get()
+    mask = np.ones(len(df), dtype=bool)
+    if start_ts is not None:
+        mask &= (df["TRANSACTIONDATE"] >= start_ts).values
+    if end_ts is not None:
+        mask &= (df["TRANSACTIONDATE"] <= end_ts).values
+
+    columns = [ANALYTICS_GROUPS[g] for g in groups]
+    summary = (
+        df[mask]
+        .groupby(columns, dropna=False, sort=True)
+        .agg(
+            AMOUNT_SUM=("AMOUNT", "sum"),
+            AMOUNT_COUNT=("AMOUNT", "count"),
+            REWARDSVALUE_SUM=("REWARDSVALUE", "sum"),
+            REWARDSVALUE_COUNT=("REWARDSVALUE", "count"),
+            TRANSACTIONS=("AMOUNT", "size"),
+        )
+        .reset_index()
+    )
+    return list_response(request, {
+        "groupBy": groups,
+        "start": start,
+        "end": end,
+        "rows": frame_records(summary),
+    })
 
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
+################# Get IDs ##############################
 
-        data = response.json()
+async def fetch_next_id(url: str) -> int:
+    """
+    Reserve one ID from an ORDS next-id handler. Hedged like other reads:
+    a losing duplicate only leaves a gap in the sequence.
+    """
+    async def attempt():
+        try:
+            response = await ords_client.get(url)
 
-        # return just the ID field
-        return {"budget_id": data.get("id")}
+            if response.status_code != 200:
+                raise HTTPException(status_code=response.status_code, detail=response.text)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+            data = response.json()
+            if data.get("id") is None:
+                raise HTTPException(status_code=500, detail=f"ORDS returned no id: {data}")
+            return data["id"]
 
-@app.get("/get-recur-expense-id")
-def get_recur_expense_id(request: Request, key: str = Query(None)):
-    client_key = request.headers.get("X-API-Key") or key
-    if client_key != API_KEY:
-        raise HTTPException(status_code=403, detail="Forbidden")
-    ORDS_NEXT_ID_URL = os.environ["get_recur_expense_id_url"]
-    try:
-        response = requests.get(ORDS_NEXT_ID_URL)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
+    return await ords_upstream.call("next-id", attempt, ORDS_DEADLINE, hedge=True)
 
-        data = response.json()
+class IdAllocator:
+    """
+    Block allocator for one ORDS sequence. IDs are reserved ID_BLOCK_SIZE at
+    a time and handed out from memory; when the pool drops to ID_LOW_WATER a
+    background refill tops it up so callers rarely wait on ORDS. The ORDS
+    handlers hand out one ID per call, so a refill is a bounded burst of
+    those. When the pool is short (cold start), the caller only waits for
+    the IDs it needs and the block top-up happens in the background. IDs
+    still pooled at shutdown are simply skipped (sequence gaps).
+    """
+    def __init__(self, url_env: str):
+        self.url_env = url_env
+        self._ids = deque()
+        self._lock = asyncio.Lock()
+        self._background = None
+
+    async def take(self, count: int = 1) -> List[int]:
+        ids = [self._ids.popleft() for _ in range(min(count, len(self._ids)))]
+        if len(ids) < count:
+            try:
+                ids += await self._reserve(count - len(ids))
+            except Exception:
+                self._ids.extendleft(reversed(ids))
+                raise
+        if len(self._ids) <= ID_LOW_WATER and (self._background is None or self._background.done()):
+            self._background = asyncio.create_task(self._refill_quietly())
+        return ids
 
-        # return just the ID field
-        return {"recur_expense_id": data.get("id")}
+    async def _reserve(self, count: int) -> List[int]:
+        url = settings.url(self.url_env)
+        semaphore = asyncio.Semaphore(ORDS_BATCH_CONCURRENCY)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        async def reserve():
+            async with semaphore:
+                return await fetch_next_id(url)
 
-@app.get("/get-invest-veh-id")
-def get_invest_veh_id(request: Request, key: str = Query(None)):
+        return sorted(await asyncio.gather(*(reserve() for _ in range(count))))
+
+    async def _refill_quietly(self):
+        try:
+            async with self._lock:
+                missing = ID_LOW_WATER + ID_BLOCK_SIZE - len(self._ids)
+                if missing > 0:
+                    self._ids.extend(await self._reserve(missing))
+        except Exception as e:
+            logger.error(f"ID refill failed for {self.url_env}: {e}")
+
+# sequence name -> allocator over that sequence's ORDS next-id URL
+id_allocators = {
+    "expense": IdAllocator("get_expense_url"),
+    "budget": IdAllocator("get_budget_id_url"),
+    "recur_expense": IdAllocator("get_recur_expense_id_url"),
+    "invest_veh": IdAllocator("get-invest-veh-id-url"),
+    "invest_unit": IdAllocator("get-invest-unit-id-url"),
+}
+
+@app.get("/get-expense-id")
+async def get_expense_id(request: Request, key: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    ORDS_NEXT_ID_URL = os.environ["get-invest-veh-id-url"]
-    try:
-        response = requests.get(ORDS_NEXT_ID_URL)
-
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
+    ids = await id_allocators["expense"].take()
+    return {"expense_id": ids[0]}
 
-        data = response.json()
+@app.get("/get-budget-id")
+async def get_budget_id(request: Request, key: str = Query(None)):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    ids = await id_allocators["budget"].take()
+    return {"budget_id": ids[0]}
 
-        # return just the ID field
-        return {"invest_veh_id": data.get("id")}
+@app.get("/get-recur-expense-id")
+async def get_recur_expense_id(request: Request, key: str = Query(None)):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    ids = await id_allocators["recur_expense"].take()
+    return {"recur_expense_id": ids[0]}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/get-invest-veh-id")
+async def get_invest_veh_id(request: Request, key: str = Query(None)):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    ids = await id_allocators["invest_veh"].take()
+    return {"invest_veh_id": ids[0]}
 
 @app.get("/get-invest-unit-id")
-def get_invest_unit_id(request: Request, key: str = Query(None)):
+async def get_invest_unit_id(request: Request, key: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    ORDS_NEXT_ID_URL = os.environ["get-invest-unit-id-url"]
-    try:
-        response = requests.get(ORDS_NEXT_ID_URL)
-
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
-
-        data = response.json()
+    ids = await id_allocators["invest_unit"].take()
+    return {"invest_unit_id": ids[0]}
 
-        # return just the ID field
-        return {"invest_unit_id": data.get("id")}
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/get-ids")
+async def get_ids(
+    request: Request,
+    sequence: str = Query(...),
+    count: int = Query(1),
+    key: str = Query(None)
+):
+    """
+    Batch form for bulk imports: /get-ids?sequence=expense&count=50
+    Sequences: expense, budget, recur_expense, invest_veh, invest_unit.
+    """
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if sequence not in id_allocators:
+        raise HTTPException(status_code=400, detail=f"Unknown sequence '{sequence}'")
+    if not 1 <= count <= ORDS_BATCH_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {ORDS_BATCH_MAX_ROWS}")
+    return {"sequence": sequence, "ids": await id_allocators[sequence].take(count)}
 
 
 @app.get("/get-total-rewards-month")
-def get_total_rewards_month(request: Request, key: str = Query(None)):
+async def get_total_rewards_month(request: Request, key: str = Query(None)):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
-    GET_REWARD_TOTAL_MONTH_URL = os.environ["GET_REWARD_TOTAL_MONTH_URL"]
+    GET_REWARD_TOTAL_MONTH_URL = settings.url("GET_REWARD_TOTAL_MONTH_URL")
     try:
-        response = requests.get(GET_REWARD_TOTAL_MONTH_URL)
+        response = await ords_upstream.timed(url_name(GET_REWARD_TOTAL_MONTH_URL), lambda: ords_client.get(GET_REWARD_TOTAL_MONTH_URL))
 
         if response.status_code != 200:
             raise HTTPException(status_code=response.status_code, detail=response.text)
@@ -389,17 +1974,8 @@ def get_total_rewards_month(request: Request, key: str = Query(None)):
 
 ################# CRUD ##############################
 
-@app.post("/updateExpense")
-def update_expense(
-    request: Request,
-    expense: Expense,
-    key: str = Query(None)
-):
-    client_key = request.headers.get("X-API-Key") or key
-    if client_key != API_KEY:
-        raise HTTPException(status_code=403, detail="Forbidden")
-    ORACLE_INSERT_EXPENSE_URL = os.environ["ORACLE_INSERT_EXPENSE_URL"]
-    payload = {
+def expense_payload(expense: Expense) -> Dict[str, Any]:
+    return {
         "p_id": expense.ID,
         "p_cardid": expense.CARDID,
         "p_trxdate": expense.TRANSACTIONDATE,
@@ -416,35 +1992,8 @@ def update_expense(
         "p_recuryn": expense.RECURYN
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
-    }
-
-    try:
-        response = requests.post(f"{ORACLE_INSERT_EXPENSE_URL}", headers=headers, json=payload)
-        if response.status_code == 200:
-            return {"status": "success"}
-        else:
-            print(f"ORDS response error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=500, detail=response.text)
-    except requests.exceptions.RequestException as e:
-        print(f"ORDS request failed: {e}")
-        raise HTTPException(status_code=500, detail=f"ORDS communication failed: {e}")
-
-@app.post("/updateBudgetCategory")
-def update_budget_category(
-    request: Request,
-    category: BudgetCategory,
-    key: str = Query(None)
-):
-    client_key = request.headers.get("X-API-Key") or key
-    if client_key != API_KEY:
-        raise HTTPException(status_code=403, detail="Forbidden")
-
-    ORACLE_INSERT_BUDGET_URL = os.environ["ORACLE_INSERT_BUDGET_URL"]
-
-    payload = {
+def budget_category_payload(category: BudgetCategory) -> Dict[str, Any]:
+    return {
         "p_id": category.ID,
         "p_expensecategory": category.EXPENSECATEGORY,
         "p_tosync": category.TOSYNC,
@@ -452,34 +2001,8 @@ def update_budget_category(
         "p_updateddt": category.UPDATEDDT
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
-    }
-
-    try:
-        response = requests.post(ORACLE_INSERT_BUDGET_URL, headers=headers, json=payload)
-        if response.status_code == 200:
-            return {"status": "success"}
-        else:
-            logger.error(f"ORDS error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=500, detail=response.text)
-    except requests.exceptions.RequestException as e:
-        logger.error(f"ORDS request failed: {e}")
-        raise HTTPException(status_code=500, detail=f"ORDS communication failed: {e}")
-
-@app.post("/updateRecurExpenses")
-def update_recur_expense(
-    request: Request,
-    recurExpenses: RecurExpense,
-    key: str = Query(None)
-):
-    client_key = request.headers.get("X-API-Key") or key
-    if client_key != API_KEY:
-        raise HTTPException(status_code=403, detail="Forbidden")
-
-    ORACLE_INSERT_RECUR_EXPENSE_URL = os.environ["ORACLE_INSERT_RECUR_EXPENSE_URL"]
-    payload = {
+def recur_expense_payload(recurExpenses: RecurExpense) -> Dict[str, Any]:
+    return {
         "p_id": recurExpenses.ID,
         "p_title": recurExpenses.DESCRIPTION,
         "p_amount": recurExpenses.AMOUNT,
@@ -495,59 +2018,141 @@ def update_recur_expense(
         "p_expenseid": recurExpenses.EXPENSE_ID
     }
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
-    }
-
+def invest_vehicle_payload(investVehicle: InvestVehicle) -> Dict[str, Any]:
+    return {
+        "p_id": investVehicle.ID,
+        "p_name": investVehicle.NAME,
+        "p_updateddate": investVehicle.UPDATEDDT,
+        "p_deleteyn": investVehicle.DELETEYN,
+        "p_tosync": investVehicle.TOSYNC
+    }
+
+def investment_unit_payload(investmentUnit: InvestmentUnit) -> Dict[str, Any]:
+    return {
+        "p_id": investmentUnit.ID,
+        "p_veh_id": investmentUnit.VEH_ID,
+        "p_name": investmentUnit.NAME,
+        "p_ticker": investmentUnit.TICKER,
+        "p_holdingamt": investmentUnit.HOLDINGAMT,
+        "p_avgboughtprice": investmentUnit.AVGBOUGHTPRICE,
+        "p_deleteyn": investmentUnit.DELETEYN,
+        "p_updateddt": investmentUnit.UPDATEDDT,
+        "p_tosync": investmentUnit.TOSYNC
+    }
+
+def card_reward_limit_payload(cardRewardLimit: CardRewardLimit) -> Dict[str, Any]:
+    return {
+        "p_id": cardRewardLimit.ID,
+        "p_card": cardRewardLimit.CARDID,
+        "p_rewardslimit": cardRewardLimit.REWARDSLIMIT,
+        "p_rewardlimitused": cardRewardLimit.REWARDLIMITUSED,
+        "p_baserewardunlimited": cardRewardLimit.BASEREWARDUNLIMITED,
+        "p_tosync": cardRewardLimit.TOSYNC,
+        "p_deleteyn": cardRewardLimit.DELETEYN,
+        "p_updateddt": cardRewardLimit.UPDATEDDT
+    }
+
+async def upsert_ords(url: str, payload: Dict[str, Any]):
+    """
+    POST one row to an ORDS upsert handler. Raises HTTPException(500) on a
+    non-200 answer or a transport failure, same as the original handlers.
+    Timed for metrics, but never hedged or failed fast by the breaker.
+    """
     try:
-        response = requests.post(ORACLE_INSERT_RECUR_EXPENSE_URL, headers=headers, json=payload)
-        if response.status_code == 200:
-            return {"status": "success"}
-        else:
-            logger.error(f"ORDS error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=500, detail=response.text)
-    except requests.exceptions.RequestException as e:
+        response = await ords_upstream.timed(
+            url_name(url), lambda: ords_client.post(url, headers=ORDS_JSON_HEADERS, json=payload)
+        )
+    except httpx.HTTPError as e:
         logger.error(f"ORDS request failed: {e}")
         raise HTTPException(status_code=500, detail=f"ORDS communication failed: {e}")
+    if response.status_code != 200:
+        logger.error(f"ORDS error: {response.status_code} - {response.text}")
+        raise HTTPException(status_code=500, detail=response.text)
+    return {"status": "success"}
 
-@app.post("/updateInvestmentVehicle")
-def updateInvestmentVehicle(
+async def upsert_ords_batch(url: str, rows: List[Any], to_payload) -> Dict[str, Any]:
+    """
+    Upsert many rows with at most ORDS_BATCH_CONCURRENCY requests in flight.
+    Never raises for a single row: each result carries its own status, in
+    the same order as the input.
+    """
+    if not rows:
+        raise HTTPException(status_code=400, detail="Body must contain at least one row")
+    if len(rows) > ORDS_BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {ORDS_BATCH_MAX_ROWS} rows per batch")
+
+    semaphore = asyncio.Semaphore(ORDS_BATCH_CONCURRENCY)
+
+    async def upsert_one(row):
+        async with semaphore:
+            try:
+                await upsert_ords(url, to_payload(row))
+                return {"ID": row.ID, "status": "success"}
+            except HTTPException as e:
+                return {"ID": row.ID, "status": "error", "error": {"status": e.status_code, "detail": e.detail}}
+
+    results = await asyncio.gather(*(upsert_one(row) for row in rows))
+    failed = sum(1 for r in results if r["status"] != "success")
+    return {"count": len(results), "failed": failed, "results": results}
+
+@app.post("/updateExpense")
+async def update_expense(
     request: Request,
-    investVehicle: InvestVehicle,
+    expense: Expense,
     key: str = Query(None)
 ):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
+    ORACLE_INSERT_EXPENSE_URL = settings.url("ORACLE_INSERT_EXPENSE_URL")
+    result = await upsert_ords(ORACLE_INSERT_EXPENSE_URL, expense_payload(expense))
+    reward_cache.clear()
+    transactions_frame.invalidate()
+    return result
 
-    ORACLE_INSERT_INVEST_VEH_URL = os.environ["ORACLE_INSERT_INVEST_VEH_URL"]
-    payload = {
-        "p_id": investVehicle.ID,
-        "p_name": investVehicle.NAME,
-        "p_updateddate": investVehicle.UPDATEDDT,
-        "p_deleteyn": investVehicle.DELETEYN,
-        "p_tosync": investVehicle.TOSYNC
-    }
+@app.post("/updateBudgetCategory")
+async def update_budget_category(
+    request: Request,
+    category: BudgetCategory,
+    key: str = Query(None)
+):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
-    }
+    ORACLE_INSERT_BUDGET_URL = settings.url("ORACLE_INSERT_BUDGET_URL")
+    result = await upsert_ords(ORACLE_INSERT_BUDGET_URL, budget_category_payload(category))
+    query_cache.invalidate("category_query")
+    return result
 
-    try:
-        response = requests.post(ORACLE_INSERT_INVEST_VEH_URL, headers=headers, json=payload)
-        if response.status_code == 200:
-            return {"status": "success"}
-        else:
-            logger.error(f"ORDS error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=500, detail=response.text)
-    except requests.exceptions.RequestException as e:
-        logger.error(f"ORDS request failed: {e}")
-        raise HTTPException(status_code=500, detail=f"ORDS communication failed: {e}")
+@app.post("/updateRecurExpenses")
+async def update_recur_expense(
+    request: Request,
+    recurExpenses: RecurExpense,
+    key: str = Query(None)
+):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    ORACLE_INSERT_RECUR_EXPENSE_URL = settings.url("ORACLE_INSERT_RECUR_EXPENSE_URL")
+    return await upsert_ords(ORACLE_INSERT_RECUR_EXPENSE_URL, recur_expense_payload(recurExpenses))
+
+@app.post("/updateInvestmentVehicle")
+async def updateInvestmentVehicle(
+    request: Request,
+    investVehicle: InvestVehicle,
+    key: str = Query(None)
+):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    ORACLE_INSERT_INVEST_VEH_URL = settings.url("ORACLE_INSERT_INVEST_VEH_URL")
+    return await upsert_ords(ORACLE_INSERT_INVEST_VEH_URL, invest_vehicle_payload(investVehicle))
 
 @app.post("/updateInvestmentUnit")
-def update_investment_unit(
+async def update_investment_unit(
     request: Request,
     investmentUnit: InvestmentUnit,
     key: str = Query(None)
@@ -556,36 +2161,13 @@ def update_investment_unit(
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    ORACLE_INSERT_INVESTMENT_UNIT_URL = os.environ["ORACLE_INSERT_INVESTMENT_UNIT_URL"]
-    payload = {
-        "p_id": investmentUnit.ID,
-        "p_veh_id": investmentUnit.VEH_ID,
-        "p_name": investmentUnit.NAME,
-        "p_ticker": investmentUnit.TICKER,
-        "p_holdingamt": investmentUnit.HOLDINGAMT,
-        "p_avgboughtprice": investmentUnit.AVGBOUGHTPRICE,
-        "p_deleteyn": investmentUnit.DELETEYN,
-        "p_updateddt": investmentUnit.UPDATEDDT,
-        "p_tosync": investmentUnit.TOSYNC
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
-    }
-
-    try:
-        response = requests.post(ORACLE_INSERT_INVESTMENT_UNIT_URL, headers=headers, json=payload)
-        if response.status_code == 200:
-            return {"status": "success"}
-        else:
-            logger.error(f"ORDS error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=500, detail=response.text)
-    except requests.exceptions.RequestException as e:
-        logger.error(f"ORDS request failed: {e}")
-        raise HTTPException(status_code=500, detail=f"ORDS communication failed: {e}")
+    ORACLE_INSERT_INVESTMENT_UNIT_URL = settings.url("ORACLE_INSERT_INVESTMENT_UNIT_URL")
+    result = await upsert_ords(ORACLE_INSERT_INVESTMENT_UNIT_URL, investment_unit_payload(investmentUnit))
+    query_cache.invalidate("investment_unit_query")
+    return result
 
 @app.post("/updateCardRewardLimit")
-def update_card_reward_limit(
+async def update_card_reward_limit(
     request: Request,
     cardRewardLimit: CardRewardLimit,
     key: str = Query(None)
@@ -594,81 +2176,182 @@ def update_card_reward_limit(
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    ORACLE_INSERT_REWARD_LIMIT_URL = os.environ["ORACLE_INSERT_REWARD_LIMIT_URL"]
+    ORACLE_INSERT_REWARD_LIMIT_URL = settings.url("ORACLE_INSERT_REWARD_LIMIT_URL")
+    result = await upsert_ords(ORACLE_INSERT_REWARD_LIMIT_URL, card_reward_limit_payload(cardRewardLimit))
+    invalidate_card_rewards([cardRewardLimit.CARDID])
+    return result
 
-    payload = {
-        "p_id": cardRewardLimit.ID,
-        "p_card": cardRewardLimit.CARDID,
-        "p_rewardslimit": cardRewardLimit.REWARDSLIMIT,
-        "p_rewardlimitused": cardRewardLimit.REWARDLIMITUSED,
-        "p_baserewardunlimited": cardRewardLimit.BASEREWARDUNLIMITED,
-        "p_tosync": cardRewardLimit.TOSYNC,
-        "p_deleteyn": cardRewardLimit.DELETEYN,
-        "p_updateddt": cardRewardLimit.UPDATEDDT
-    }
+################# Batch CRUD ##############################
+# Same upserts as above, many rows per request, e.g. a device flushing its
+# offline TOSYNC queue. Response: {"count", "failed", "results": [{"ID", "status", "error"?}]}
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
-    }
+@app.post("/updateExpenses")
+async def update_expenses(
+    request: Request,
+    expenses: List[Expense],
+    key: str = Query(None)
+):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    ORACLE_INSERT_EXPENSE_URL = settings.url("ORACLE_INSERT_EXPENSE_URL")
+    result = await upsert_ords_batch(ORACLE_INSERT_EXPENSE_URL, expenses, expense_payload)
+    reward_cache.clear()
+    transactions_frame.invalidate()
+    return result
+
+@app.post("/updateBudgetCategories")
+async def update_budget_categories(
+    request: Request,
+    categories: List[BudgetCategory],
+    key: str = Query(None)
+):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    ORACLE_INSERT_BUDGET_URL = settings.url("ORACLE_INSERT_BUDGET_URL")
+    result = await upsert_ords_batch(ORACLE_INSERT_BUDGET_URL, categories, budget_category_payload)
+    query_cache.invalidate("category_query")
+    return result
 
-    try:
-        response = requests.post(ORACLE_INSERT_REWARD_LIMIT_URL, headers=headers, json=payload)
-        if response.status_code == 200:
-            return {"status": "success"}
-        else:
-            logger.error(f"ORDS error: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=500, detail=response.text)
-    except requests.exceptions.RequestException as e:
-        logger.error(f"ORDS request failed: {e}")
-        raise HTTPException(status_code=500, detail=f"ORDS communication failed: {e}")
+@app.post("/updateRecurExpensesBatch")
+async def update_recur_expenses_batch(
+    request: Request,
+    recurExpenses: List[RecurExpense],
+    key: str = Query(None)
+):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    ORACLE_INSERT_RECUR_EXPENSE_URL = settings.url("ORACLE_INSERT_RECUR_EXPENSE_URL")
+    return await upsert_ords_batch(ORACLE_INSERT_RECUR_EXPENSE_URL, recurExpenses, recur_expense_payload)
 
+@app.post("/updateInvestmentVehicles")
+async def update_investment_vehicles(
+    request: Request,
+    investVehicles: List[InvestVehicle],
+    key: str = Query(None)
+):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    ORACLE_INSERT_INVEST_VEH_URL = settings.url("ORACLE_INSERT_INVEST_VEH_URL")
+    return await upsert_ords_batch(ORACLE_INSERT_INVEST_VEH_URL, investVehicles, invest_vehicle_payload)
 
-@app.post("/queryRewardLimit")
-def queryRewardLimit(
+@app.post("/updateInvestmentUnits")
+async def update_investment_units(
     request: Request,
-    queryRewardLimit: QueryRewardLimit,
+    investmentUnits: List[InvestmentUnit],
     key: str = Query(None)
 ):
     client_key = request.headers.get("X-API-Key") or key
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
+    ORACLE_INSERT_INVESTMENT_UNIT_URL = settings.url("ORACLE_INSERT_INVESTMENT_UNIT_URL")
+    result = await upsert_ords_batch(ORACLE_INSERT_INVESTMENT_UNIT_URL, investmentUnits, investment_unit_payload)
+    query_cache.invalidate("investment_unit_query")
+    return result
 
-    ORACLE_QUERY_REWARD_LIMIT_URL = os.environ["ORACLE_QUERY_REWARD_LIMIT_URL"]
-    payload = {
-        "P1_CARDID": queryRewardLimit.P1_CARDID,
-        "P1_EXPENSEID": queryRewardLimit.P1_EXPENSEID
-    }
+@app.post("/updateCardRewardLimits")
+async def update_card_reward_limits(
+    request: Request,
+    cardRewardLimits: List[CardRewardLimit],
+    key: str = Query(None)
+):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    ORACLE_INSERT_REWARD_LIMIT_URL = settings.url("ORACLE_INSERT_REWARD_LIMIT_URL")
+    result = await upsert_ords_batch(ORACLE_INSERT_REWARD_LIMIT_URL, cardRewardLimits, card_reward_limit_payload)
+    invalidate_card_rewards(r.CARDID for r in cardRewardLimits)
+    return result
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
-    }
 
-    try:
-        response = requests.post(
-            ORACLE_QUERY_REWARD_LIMIT_URL,
-            headers=headers,
-            json=payload
-        )
-        if response.status_code == 200:
-            if not response.text.strip():
-                raise HTTPException(status_code=500, detail="ORDS returned 200 with empty body")
-            try:
-                data = response.json()
-            except ValueError:
-                raise HTTPException(status_code=500, detail="Invalid JSON returned from ORDS")
+################# Reward limits ##############################
 
-            return {"total_amount": data.get("total_amount")}
-        else:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
+async def post_ords_query(url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """POST to an ORDS query handler and return its JSON body (a hedged read)."""
+    async def attempt():
+        try:
+            response = await ords_client.post(url, headers=ORDS_JSON_HEADERS, json=payload)
+            if response.status_code == 200:
+                if not response.text.strip():
+                    raise HTTPException(status_code=500, detail="ORDS returned 200 with empty body")
+                try:
+                    return response.json()
+                except ValueError:
+                    raise HTTPException(status_code=500, detail="Invalid JSON returned from ORDS")
+            else:
+                raise HTTPException(status_code=response.status_code, detail=response.text)
+
+        except httpx.HTTPError as e:
+            logger.error(f"ORDS request failed: {e}")
+            raise HTTPException(status_code=500, detail=f"ORDS communication failed: {e}")
+
+    return await ords_upstream.call("reward-query", attempt, ORDS_DEADLINE, hedge=True)
+
+# Reward results memoized per card (tagged with the card id). A write through
+# /updateCardRewardLimit* evicts that card's entries; an expense write clears
+# them all, since an edit can move an expense off a card the payload no
+# longer names
+reward_cache = TTLCache(REWARD_CACHE_MAX_ENTRIES)
+
+async def reward_limit_total(card_id: int, expense_id: int):
+    cache_key = ("limit", card_id, expense_id)
+    total = reward_cache.get(cache_key)
+    if total is MISSING:
+        generation = reward_cache.generation(card_id)
+        ORACLE_QUERY_REWARD_LIMIT_URL = settings.url("ORACLE_QUERY_REWARD_LIMIT_URL")
+        data = await post_ords_query(ORACLE_QUERY_REWARD_LIMIT_URL, {"P1_CARDID": card_id, "P1_EXPENSEID": expense_id})
+        total = data.get("total_amount")
+        reward_cache.set(cache_key, total, REWARD_CACHE_TTL, tag=card_id, generation=generation)
+    return total
+
+async def reward_miles_by_card(card_id: int):
+    cache_key = ("card", card_id)
+    miles = reward_cache.get(cache_key)
+    if miles is MISSING:
+        generation = reward_cache.generation(card_id)
+        ORACLE_QUERY_REWARD_BY_CARD_URL = settings.url("ORACLE_QUERY_REWARD_BY_CARD_URL")
+        data = await post_ords_query(ORACLE_QUERY_REWARD_BY_CARD_URL, {"P1_CARDID": card_id})
+        miles = data.get("total_miles")
+        reward_cache.set(cache_key, miles, REWARD_CACHE_TTL, tag=card_id, generation=generation)
+    return miles
+
+def invalidate_card_rewards(card_ids):
+    for card_id in set(card_ids):
+        reward_cache.invalidate(card_id)
+
+async def gather_bounded(calls):
+    """Await coroutines with at most ORDS_BATCH_CONCURRENCY running; exceptions are returned, not raised."""
+    semaphore = asyncio.Semaphore(ORDS_BATCH_CONCURRENCY)
+
+    async def run(call):
+        async with semaphore:
+            return await call
+
+    return await asyncio.gather(*(run(call) for call in calls), return_exceptions=True)
+
+def error_envelope(e: Exception) -> Dict[str, Any]:
+    if isinstance(e, HTTPException):
+        return {"status": e.status_code, "detail": e.detail}
+    return {"status": 500, "detail": str(e)}
 
-    except requests.exceptions.RequestException as e:
-        print(f"ORDS request failed: {e}")
-        raise HTTPException(status_code=500, detail=f"ORDS communication failed: {e}")
+@app.post("/queryRewardLimit")
+async def queryRewardLimit(
+    request: Request,
+    queryRewardLimit: QueryRewardLimit,
+    key: str = Query(None)
+):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    total = await reward_limit_total(queryRewardLimit.P1_CARDID, queryRewardLimit.P1_EXPENSEID)
+    return {"total_amount": total}
 
 @app.post("/queryRewardByCard")
-def queryRewardByCard(
+async def queryRewardByCard(
     request: Request,
     queryRewardByCard: QueryRewardByCard,
     key: str = Query(None)
@@ -677,37 +2360,67 @@ def queryRewardByCard(
     if client_key != API_KEY:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    ORACLE_QUERY_REWARD_BY_CARD_URL = os.environ["ORACLE_QUERY_REWARD_BY_CARD_URL"]
-    payload = {
-        "P1_CARDID": queryRewardByCard.P1_CARDID
-    }
+    miles = await reward_miles_by_card(queryRewardByCard.P1_CARDID)
+    return {"total_miles": miles}
 
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
-    }
-
-    try:
-        response = requests.post(
-            ORACLE_QUERY_REWARD_BY_CARD_URL,
-            headers=headers,
-            json=payload
-        )
-        if response.status_code == 200:
-            if not response.text.strip():
-                raise HTTPException(status_code=500, detail="ORDS returned 200 with empty body")
-            try:
-                data = response.json()
-            except ValueError:
-                raise HTTPException(status_code=500, detail="Invalid JSON returned from ORDS")
+@app.post("/queryRewardLimits")
+async def query_reward_limits(
+    request: Request,
+    queries: List[QueryRewardLimit],
+    key: str = Query(None)
+):
+    """
+    Many (P1_CARDID, P1_EXPENSEID) pairs in one call, e.g. a whole
+    transaction list. Results keep input order; a failed pair carries an
+    error instead of total_amount.
+    """
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if len(queries) > ORDS_BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {ORDS_BATCH_MAX_ROWS} rows per batch")
 
-            return {"total_miles": data.get("total_miles")}
+    pairs = list(dict.fromkeys((q.P1_CARDID, q.P1_EXPENSEID) for q in queries))
+    totals = dict(zip(pairs, await gather_bounded(reward_limit_total(c, e) for c, e in pairs)))
+    results = []
+    for q in queries:
+        total = totals[(q.P1_CARDID, q.P1_EXPENSEID)]
+        entry = {"P1_CARDID": q.P1_CARDID, "P1_EXPENSEID": q.P1_EXPENSEID}
+        if isinstance(total, Exception):
+            entry["error"] = error_envelope(total)
         else:
-            raise HTTPException(status_code=response.status_code, detail=response.text)
+            entry["total_amount"] = total
+        results.append(entry)
+    return {"count": len(results), "results": results}
 
-    except requests.exceptions.RequestException as e:
-        print(f"ORDS request failed: {e}")
-        raise HTTPException(status_code=500, detail=f"ORDS communication failed: {e}")
+@app.post("/queryRewardByCards")
+async def query_reward_by_cards(
+    request: Request,
+    body: QueryRewardByCards = Body(QueryRewardByCards()),
+    key: str = Query(None)
+):
+    """
+    total_miles for many cards: { "P1_CARDIDS": [1, 2] }, or every card in
+    cards_query when P1_CARDIDS is omitted.
+    """
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    card_ids = body.P1_CARDIDS
+    if card_ids is None:
+        cards = await cached_query("cards_query", settings.query("cards_query"))
+        card_ids = [row_value(card, "ID") for card in cards if row_value(card, "ID") is not None]
+    card_ids = list(dict.fromkeys(card_ids))
+
+    miles = await gather_bounded(reward_miles_by_card(card_id) for card_id in card_ids)
+    results = []
+    for card_id, total in zip(card_ids, miles):
+        if isinstance(total, Exception):
+            results.append({"P1_CARDID": card_id, "error": error_envelope(total)})
+        else:
+            results.append({"P1_CARDID": card_id, "total_miles": total})
+    return {"count": len(results), "results": results}
 
 # @app.get("/tickerPrice")
 # def get_price(symbol: str, request: Request, key: str = Query(None)):
@@ -745,6 +2458,16 @@ def session_hours_for_exchange(exchange: str | None):
     # Default to US
     return ("America/New_York", time(9, 30), time(16, 0))
 
+def extended_hours_for_exchange(exchange: str | None):
+    """
+    Return (pre_open, post_close) local times for exchanges that trade
+    outside regular hours, or None when there is no extended session.
+    """
+    tz_name, _, _ = session_hours_for_exchange(exchange)
+    if tz_name == "America/New_York":
+        return (time(4, 0), time(20, 0))
+    return None
+
 def label_session(ts_local: datetime, open_t: time, close_t: time):
     if ts_local.time() < open_t:
         return "pre"
@@ -819,18 +2542,11 @@ def label_session(ts_local: datetime, open_t: time, close_t: time):
 #         "asOf": datetime.utcnow().isoformat() + "Z",
 #     }  
 
-def fetch_one_symbol(symbol: str) -> Dict[str, Any]:
+def exchange_clock(exchange: str, tz_name_info: str):
     """
-    EXACT logic from your original /tickerPrice endpoint, factored into a helper.
-    Raises HTTPException(404) if no price is found, same as before.
+    Resolve (tz, regular_open, regular_close) for an exchange, preferring
+    Yahoo's timezone name and falling back to our own mapping.
     """
-    t = yf.Ticker(symbol)
-    info = t.fast_info or {}
-    meta = t.info or {}
-
-    # Figure out exchange + timezone + regular hours
-    tz_name_info = meta.get("exchangeTimezoneName") or info.get("timezone") or "America/New_York"
-    exchange = meta.get("exchange") or ""
     tz_name_map, reg_open, reg_close = session_hours_for_exchange(exchange)
     # Prefer Yahoo’s tz if present; fall back to our mapping tz
     tz_name = tz_name_info or tz_name_map
@@ -838,39 +2554,123 @@ def fetch_one_symbol(symbol: str) -> Dict[str, Any]:
         tz = pytz.timezone(tz_name)
     except Exception:
         tz = pytz.timezone(tz_name_map)
+    return tz, reg_open, reg_close
 
-    now_local = datetime.now(tz)
-
-    # Pull 1m history with pre/post included — 2 days to cover early premarket/post that cross midnight
-    hist = t.history(period="2d", interval="1m", prepost=True)
-
-    price = None
-    session = None
-
-    if not hist.empty:
-        # Index is tz-aware; convert to exchange tz and filter rows <= now
-        hist_local = hist.tz_convert(tz)
-        recent = hist_local[hist_local.index <= now_local]
-        if not recent.empty:
-            last_ts = recent.index[-1]
-            close_px = float(recent["Close"].iloc[-1])
-            price = close_px
-            session = label_session(last_ts, reg_open, reg_close)
-
-    # Fallbacks
-    if price is None:
-        price = info.get("last_price")
-
-    if price is None:
-        daily = t.history(period="5d")
-        if not daily.empty:
-            price = float(daily["Close"].iloc[-1])
+class SymbolMetaStore:
+    """
+    Exchange, timezone, currency and regular hours per ticker, persisted in
+    SQLite so restarts don't re-learn them. Ticker.info is only called the
+    first time a symbol is seen; rows older than SYMBOL_META_TTL are still
+    served and refreshed in the background on the Yahoo executor. Incomplete
+    rows (defaults filled in) are not persisted and go stale after
+    SYMBOL_META_RETRY.
+    """
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS symbol_meta ("
+            "symbol TEXT PRIMARY KEY, exchange TEXT, tz_name TEXT, currency TEXT,"
+            "regular_open TEXT, regular_close TEXT, fetched_at REAL)"
+        )
+        self._rows = {
+            row[0]: dict(zip(("symbol", "exchange", "tz_name", "currency", "regular_open", "regular_close", "fetched_at"), row))
+            for row in self._conn.execute("SELECT * FROM symbol_meta")
+        }
+
+    def get(self, symbol: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._rows.get(symbol)
+            ttl = SYMBOL_META_TTL if row is not None and row.get("complete", True) else SYMBOL_META_RETRY
+            stale = row is not None and datetime.now().timestamp() - row["fetched_at"] > ttl
+            if stale and symbol not in self._refreshing:
+                self._refreshing.add(symbol)
+                yahoo_executor.submit(self._refresh_quietly, symbol)
+        if row is None:
+            row = self.refresh(symbol)
+        return row
+
+    def refresh(self, symbol: str) -> Dict[str, Any]:
+        row = load_symbol_meta(symbol)
+        with self._lock:
+            self._rows[symbol] = row
+            if not row["complete"]:
+                return row
+            self._conn.execute(
+                "INSERT OR REPLACE INTO symbol_meta VALUES (?, ?, ?, ?, ?, ?, ?)",
+                tuple(row[k] for k in ("symbol", "exchange", "tz_name", "currency", "regular_open", "regular_close", "fetched_at")),
+            )
+            self._conn.commit()
+        return row
+
+    def _refresh_quietly(self, symbol: str):
+        try:
+            self.refresh(symbol)
+        except Exception as e:
+            logger.error(f"Symbol metadata refresh failed for {symbol}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(symbol)
 
-    if price is None:
-        raise HTTPException(status_code=404, detail=f"No price for {symbol}")
+def load_symbol_meta(symbol: str) -> Dict[str, Any]:
+    """
+    The slow path: ask Yahoo (Ticker.info) for a symbol's listing details.
+    "complete" is False when the exchange or timezone had to be defaulted.
+    """
+    t = yf.Ticker(symbol)
+    info = t.fast_info or {}
+    with yahoo_timer("info"):
+        meta = t.info or {}
+    exchange = meta.get("exchange") or ""
+    tz_name = meta.get("exchangeTimezoneName") or info.get("timezone")
+    _, reg_open, reg_close = session_hours_for_exchange(exchange)
+    return {
+        "symbol": symbol,
+        "complete": bool(exchange and tz_name),
+        "exchange": exchange,
+        "tz_name": tz_name or "America/New_York",
+        "currency": info.get("currency") or meta.get("currency") or "USD",
+        "regular_open": reg_open.strftime("%H:%M"),
+        "regular_close": reg_close.strftime("%H:%M"),
+        "fetched_at": datetime.now().timestamp(),
+    }
 
-    currency = info.get("currency") or meta.get("currency") or "USD"
+symbol_meta = SymbolMetaStore(SYMBOL_META_DB)
 
+@contextmanager
+def symbol_data_errors(symbol: str):
+    """Turn yfinance choking on one symbol's data into a 404 for that symbol."""
+    try:
+        yield
+    except (KeyError, ValueError, IndexError, TypeError, AttributeError) as e:
+        raise HTTPException(status_code=404, detail=f"No usable data for {symbol}: {e}")
+
+def symbol_clock(symbol: str):
+    """(exchange, currency, tz, regular_open, regular_close) from the metadata store."""
+    with symbol_data_errors(symbol):
+        row = symbol_meta.get(symbol)
+        tz, _, _ = exchange_clock(row["exchange"], row["tz_name"])
+        reg_open = time.fromisoformat(row["regular_open"])
+        reg_close = time.fromisoformat(row["regular_close"])
+    return row["exchange"], row["currency"], tz, reg_open, reg_close
+
+def last_bar(hist, tz, reg_open: time, reg_close: time):
+    """
+    (price, session) of the last 1m bar at or before now in the exchange's
+    timezone, or (None, None) if there is none.
+    """
+    if hist.empty:
+        return None, None
+    now_local = datetime.now(tz)
+    # Index is tz-aware; convert to exchange tz and filter rows <= now
+    hist_local = hist.tz_convert(tz)
+    recent = hist_local[hist_local.index <= now_local]
+    if recent.empty:
+        return None, None
+    return float(recent["Close"].iloc[-1]), label_session(recent.index[-1], reg_open, reg_close)
+
+def quote_payload(symbol: str, price: float, currency: str, session: str | None, exchange: str, tz) -> Dict[str, Any]:
     return {
         "symbol": symbol,
         "price": price,
@@ -881,12 +2681,202 @@ def fetch_one_symbol(symbol: str) -> Dict[str, Any]:
         "asOf": datetime.utcnow().isoformat() + "Z",
     }
 
+def fetch_one_symbol(symbol: str) -> Dict[str, Any]:
+    """
+    EXACT logic from your original /tickerPrice endpoint, factored into a helper.
+    Raises HTTPException(404) if no price is found, same as before.
+    """
+    with symbol_data_errors(symbol):
+        # Exchange + timezone + currency + regular hours come from the metadata
+        # store, so Ticker.info is only hit the first time a symbol is seen
+        exchange, currency, tz, reg_open, reg_close = symbol_clock(symbol)
+        t = yf.Ticker(symbol)
+
+        # Pull 1m history with pre/post included — 2 days to cover early premarket/post that cross midnight
+        with yahoo_timer("history"):
+            hist = t.history(period="2d", interval="1m", prepost=True)
+        price, session = last_bar(hist, tz, reg_open, reg_close)
+
+        # Fallbacks
+        if price is None:
+            with yahoo_timer("fast_info"):
+                price = (t.fast_info or {}).get("last_price")
+
+        if price is None:
+            with yahoo_timer("history"):
+                daily = t.history(period="5d")
+            if not daily.empty:
+                price = float(daily["Close"].iloc[-1])
+
+        if price is None:
+            raise HTTPException(status_code=404, detail=f"No price for {symbol}")
+
+    return quote_payload(symbol, price, currency, session, exchange, tz)
+
+def download_frames(symbols: List[str], **kwargs) -> Dict[str, "pd.DataFrame"]:
+    """
+    One yf.download call for many symbols, split back into per-symbol frames
+    shaped like Ticker.history() output. Symbols with no data are left out.
+    yf.download fetches each symbol separately on its own thread pool, which
+    sits outside YAHOO_WORKERS; it is capped at TICKER_CONCURRENCY threads.
+    """
+    if not symbols:
+        return {}
+    with yahoo_timer("download"):
+        data = yf.download(symbols, group_by="ticker", auto_adjust=True, progress=False, threads=TICKER_CONCURRENCY, **kwargs)
+    frames = {}
+    for sym in symbols:
+        if isinstance(data.columns, pd.MultiIndex):
+            if sym not in data.columns.get_level_values(0):
+                continue
+            frame = data[sym]
+        else:
+            frame = data
+        # download() aligns all symbols on one index; drop the padding rows
+        frame = frame.dropna(subset=["Close"])
+        if frame.index.tz is None:
+            frame = frame.tz_localize("UTC")
+        frames[sym] = frame
+    return frames
+
+def fetch_symbols_batch(clocks: Dict[str, tuple]) -> Dict[str, Dict[str, Any]]:
+    """
+    Quotes from one intraday yf.download for symbols whose symbol_clock is
+    already known. Symbols without a usable bar are left out, for the
+    per-symbol path and its fallbacks to handle.
+    """
+    intraday = download_frames(list(clocks), period="2d", interval="1m", prepost=True)
+    quotes = {}
+    for sym, (exchange, currency, tz, reg_open, reg_close) in clocks.items():
+        if sym not in intraday:
+            continue
+        price, session = last_bar(intraday[sym], tz, reg_open, reg_close)
+        if price is not None:
+            quotes[sym] = quote_payload(sym, price, currency, session, exchange, tz)
+    return quotes
+
+price_cache = TTLCache(PRICE_CACHE_MAX_ENTRIES)
+
+def price_ttl(quote: Dict[str, Any]) -> float:
+    """
+    How long a quote stays fresh, based on where the exchange is *now*:
+    a few seconds in regular hours, longer in pre/post, and until the next
+    session starts when the market is closed (overnight, weekends).
+    """
+    exchange = None if quote["exchange"] == "unknown" else quote["exchange"]
+    tz = pytz.timezone(quote["exchangeTz"])
+    _, reg_open, reg_close = session_hours_for_exchange(exchange)
+    extended = extended_hours_for_exchange(exchange)
+    first_open = extended[0] if extended else reg_open
+
+    now_local = datetime.now(tz)
+    day = now_local.date()
+    if now_local.weekday() < 5 and now_local.time() < first_open:
+        next_start = day
+    else:
+        next_start = day + timedelta(days=1)
+        while next_start.weekday() >= 5:
+            next_start += timedelta(days=1)
+    until_next_session = (tz.localize(datetime.combine(next_start, first_open)) - now_local).total_seconds()
+
+    if now_local.weekday() >= 5:
+        return until_next_session
+    session = label_session(now_local, reg_open, reg_close)
+    if session == "regular":
+        return PRICE_TTL_REGULAR
+    if extended and extended[0] <= now_local.time() <= extended[1]:
+        if session == "pre":
+            until_open = (tz.localize(datetime.combine(day, reg_open)) - now_local).total_seconds()
+            return max(1.0, min(PRICE_TTL_EXTENDED, until_open))
+        return PRICE_TTL_EXTENDED
+    return until_next_session
+
+def get_quote(symbol: str) -> Dict[str, Any]:
+    """
+    fetch_one_symbol behind the session-aware price cache. Cached quotes are
+    returned as-is, including their original asOf.
+    """
+    quote = price_cache.get(symbol)
+    if quote is MISSING:
+        quote = fetch_one_symbol(symbol)
+        price_cache.set(symbol, quote, price_ttl(quote))
+    return quote
+
+def price_error(sym: str, e: Exception) -> Dict[str, Any]:
+    """
+    Per-symbol error envelope used in /tickerPrices results. When Yahoo is
+    failing (timeout, 5xx, open circuit) the last known quote is returned
+    instead, flagged stale.
+    """
+    if is_upstream_failure(e):
+        quote = price_cache.get_stale(sym)
+        if quote is not MISSING:
+            return {**quote, "stale": True}
+    if isinstance(e, HTTPException):
+        return {"symbol": sym, "error": {"status": e.status_code, "detail": e.detail}}
+    return {"symbol": sym, "error": {"status": 500, "detail": str(e)}}
+
+async def fetch_quotes(merged: List[str]) -> List[Dict[str, Any]]:
+    """
+    Quotes for upper-cased symbols, in request order; each entry is either a
+    quote or the per-symbol error envelope. Uses the PRICE_ENGINE engine;
+    every Yahoo call on either path has its own TICKER_DEADLINE.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(TICKER_CONCURRENCY)
+
+    async def fetch(sym: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                # coalesced across concurrent requests for the same symbol
+                return await quote_flight.do(sym, lambda: yahoo_upstream.call(
+                    "quote", lambda: loop.run_in_executor(yahoo_executor, get_quote, sym), TICKER_DEADLINE, hedge=True
+                ))
+            except Exception as e:
+                return price_error(sym, e)
+
+    if PRICE_ENGINE != "batch":
+        # gather keeps request order; a slow or failed symbol only affects its own slot
+        return list(await asyncio.gather(*(fetch(sym) for sym in merged)))
+
+    async def clock(sym: str):
+        async with semaphore:
+            try:
+                return await yahoo_upstream.call(
+                    "info", lambda: loop.run_in_executor(yahoo_executor, symbol_clock, sym), TICKER_DEADLINE
+                )
+            except Exception as e:
+                return e
+
+    quotes: Dict[str, Any] = {}
+    cold = [sym for sym in dict.fromkeys(merged) if price_cache.get(sym) is MISSING]
+    clocks = {}
+    for sym, result in zip(cold, await asyncio.gather(*(clock(sym) for sym in cold))):
+        if isinstance(result, Exception):
+            quotes[sym] = price_error(sym, result)
+        else:
+            clocks[sym] = result
+    if clocks:
+        try:
+            downloaded = await yahoo_upstream.call(
+                "download", lambda: loop.run_in_executor(yahoo_executor, fetch_symbols_batch, clocks), TICKER_DEADLINE
+            )
+        except Exception as e:
+            logger.warning(f"Batch download failed, fetching per symbol: {e.detail if isinstance(e, HTTPException) else e}")
+            downloaded = {}
+        for sym, quote in downloaded.items():
+            price_cache.set(sym, quote, price_ttl(quote))
+            quotes[sym] = quote
+    rest = [sym for sym in dict.fromkeys(merged) if sym not in quotes]
+    quotes.update(zip(rest, await asyncio.gather(*(fetch(sym) for sym in rest))))
+    return [quotes[sym] for sym in merged]
+
 def auth_ok(request: Request, key_from_query: Optional[str], key_from_body: Optional[str] = None) -> bool:
     client_key = request.headers.get("X-API-Key") or key_from_body or key_from_query
     return client_key == API_KEY
 
 @app.post("/tickerPrices")
-def post_prices(
+async def post_prices(
     request: Request,
     body: PricesRequest = Body(...),
     key: str = Query(None)
@@ -902,17 +2892,265 @@ def post_prices(
     if not merged:
         raise HTTPException(status_code=400, detail="Body.symbols must contain at least one ticker")
 
-    results = []
-    for sym in merged:
+    results = await fetch_quotes(merged)
+    return {"count": len(results), "results": results}
+
+################# Portfolio ##############################
+
+def rows_frame(rows: List[Dict[str, Any]], numeric: tuple = ()) -> "pd.DataFrame":
+    """ORDS rows as a DataFrame with upper-cased column names and numeric columns coerced."""
+    df = pd.DataFrame(rows)
+    df.columns = [str(c).upper() for c in df.columns]
+    for col in numeric:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+def frame_records(df: "pd.DataFrame") -> List[Dict[str, Any]]:
+    """DataFrame rows as JSON-safe dicts (NaN -> None)."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+def value_portfolio(units: List[Dict[str, Any]], vehicles: List[Dict[str, Any]], quotes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Market value, cost basis, unrealized P&L and weights per unit and per
+    vehicle, computed column-wise. Totals are plain sums, so a portfolio
+    mixing currencies is summed as-is. Units without a price are left out
+    of the totals and vehicle sums (costBasis included, so the three stay
+    consistent); their cost is reported separately as unpricedCostBasis.
+    """
+    prices = {q["symbol"]: q["price"] for q in quotes if "price" in q}
+    currencies = {q["symbol"]: q["currency"] for q in quotes if "price" in q}
+
+    df = rows_frame(units, numeric=("HOLDINGAMT", "AVGBOUGHTPRICE"))
+    if df.empty:
+        return {"totals": {"marketValue": 0.0, "costBasis": 0.0, "unrealizedPnl": 0.0, "unpricedCostBasis": 0.0}, "vehicles": [], "units": []}
+    if "DELETEYN" in df.columns:
+        df = df[df["DELETEYN"] != "Y"]
+
+    symbols = df["TICKER"].fillna("").str.strip().str.upper()
+    df = df.assign(
+        PRICE=symbols.map(prices),
+        CURRENCY=symbols.map(currencies),
+    )
+    df["MARKETVALUE"] = df["HOLDINGAMT"] * df["PRICE"]
+    df["COSTBASIS"] = df["HOLDINGAMT"] * df["AVGBOUGHTPRICE"]
+    df["UNREALIZEDPNL"] = df["MARKETVALUE"] - df["COSTBASIS"]
+    df["UNREALIZEDPNLPCT"] = df["UNREALIZEDPNL"] / df["COSTBASIS"].where(df["COSTBASIS"] != 0)
+
+    priced = df["PRICE"].notna()
+    sums = df.assign(
+        COSTBASIS=df["COSTBASIS"].where(priced),
+        UNPRICEDCOSTBASIS=df["COSTBASIS"].where(~priced),
+    )
+
+    total_value = df["MARKETVALUE"].sum()
+    total_cost = sums["COSTBASIS"].sum()
+    df["WEIGHT"] = df["MARKETVALUE"] / total_value if total_value else np.nan
+
+    by_vehicle = sums.groupby("VEH_ID")[["MARKETVALUE", "COSTBASIS", "UNREALIZEDPNL", "UNPRICEDCOSTBASIS"]].sum(min_count=1)
+    by_vehicle["WEIGHT"] = by_vehicle["MARKETVALUE"] / total_value if total_value else np.nan
+    by_vehicle = by_vehicle.reset_index()
+    veh = rows_frame(vehicles)
+    if not veh.empty and {"ID", "NAME"} <= set(veh.columns):
+        by_vehicle["NAME"] = by_vehicle["VEH_ID"].map(dict(zip(veh["ID"], veh["NAME"])))
+
+    unit_cols = ["ID", "VEH_ID", "NAME", "TICKER", "HOLDINGAMT", "AVGBOUGHTPRICE", "PRICE", "CURRENCY",
+                 "MARKETVALUE", "COSTBASIS", "UNREALIZEDPNL", "UNREALIZEDPNLPCT", "WEIGHT"]
+    return {
+        "totals": {
+            "marketValue": float(total_value),
+            "costBasis": float(total_cost),
+            "unrealizedPnl": float(df["UNREALIZEDPNL"].sum()),
+            "unpricedCostBasis": float(sums["UNPRICEDCOSTBASIS"].sum()),
+        },
+        "vehicles": frame_records(by_vehicle),
+        "units": frame_records(df[[c for c in unit_cols if c in df.columns]]),
+    }
+
+def held_symbols(units: List[Dict[str, Any]]) -> List[str]:
+    """Upper-cased tickers of the investment units that are not soft-deleted."""
+    return sorted({
+        str(row_value(u, "TICKER")).strip().upper()
+        for u in units
+        if row_value(u, "TICKER") and row_value(u, "DELETEYN") != "Y"
+    })
+
+@app.get("/portfolioValuation")
+async def portfolio_valuation(request: Request, key: str = Query(None)):
+    """
+    Holdings, vehicles and live prices in one call. Vehicles load alongside
+    the holdings -> prices chain; symbols without a price are listed under
+    priceErrors and count as unpriced (excluded from totals).
+    """
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    async def units_and_quotes():
+        units = await query_oracle(settings.query("investment_unit_query"))
+        symbols = held_symbols(units)
+        return units, (await fetch_quotes(symbols) if symbols else [])
+
+    (units, quotes), vehicles = await asyncio.gather(
+        units_and_quotes(),
+        query_oracle(settings.query("investment_veh_query")),
+    )
+    valuation = value_portfolio(units, vehicles, quotes)
+    valuation["priceErrors"] = [q for q in quotes if "error" in q]
+    return valuation
+
+################# Background refresh ##############################
+
+class RefreshJob:
+    """
+    One dataset kept warm by the lifespan scheduler: loaded at startup, then
+    every `interval` seconds (0 = startup only). A failed run is logged and
+    retried at the next interval; the previous data stays in place.
+    """
+    def __init__(self, name: str, interval: float, refresh):
+        self.name = name
+        self.interval = interval
+        self.refresh = refresh
+        self.runs = 0
+        self.last_refreshed = None
+        self.last_duration = None
+        self.last_error = None
+
+    async def run_once(self):
+        started = monotonic()
         try:
-            results.append(fetch_one_symbol(sym))
-        except HTTPException as e:
-            results.append({"symbol": sym, "error": {"status": e.status_code, "detail": e.detail}})
+            await self.refresh()
         except Exception as e:
-            results.append({"symbol": sym, "error": {"status": 500, "detail": str(e)}})
+            self.last_error = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.warning(f"Refresh of {self.name} failed: {self.last_error}")
+        else:
+            self.last_refreshed = datetime.now(pytz.utc).isoformat(timespec="seconds")
+            self.last_error = None
+        self.last_duration = round(monotonic() - started, 3)
+        self.runs += 1
+
+    async def run_forever(self):
+        await self.run_once()
+        while self.interval > 0:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "lastRefreshed": self.last_refreshed,
+            "lastDurationSeconds": self.last_duration,
+            "lastError": self.last_error,
+        }
+
+HELD_SYMBOLS_KEY = ("held_symbols",)
+
+def reference_refresher(dataset: str):
+    """Re-query one reference dataset and replace its query_cache entry, so cached_query keeps hitting."""
+    async def refresh():
+        sql_query = settings.query(dataset)
+        generation = query_cache.generation(dataset)
+        rows = await query_oracle(sql_query)
+        query_cache.set(query_cache_key(sql_query), rows, REFERENCE_CACHE_TTLS[dataset], tag=dataset, generation=generation)
+    return refresh
+
+async def refresh_transactions():
+    # pandas is imported on a worker thread first, so a cold start's first
+    # load does not stall the event loop
+    await asyncio.get_running_loop().run_in_executor(yahoo_executor, warm_market_stack)
+    await transactions_frame.refresh()
+
+async def refresh_held_prices():
+    """
+    Quotes for every held ticker; only symbols whose cached quote has expired
+    reach Yahoo. The ticker list is kept in query_cache for
+    REFRESH_REFERENCE_INTERVAL seconds and evicted by the investment unit
+    update handlers, so most runs do not query ORDS at all.
+    """
+    symbols = query_cache.get(HELD_SYMBOLS_KEY)
+    if symbols is MISSING:
+        generation = query_cache.generation("investment_unit_query")
+        symbols = held_symbols(await query_oracle(settings.query("investment_unit_query")))
+        query_cache.set(HELD_SYMBOLS_KEY, symbols, REFRESH_REFERENCE_INTERVAL or QUERY_CACHE_DEFAULT_TTL, tag="investment_unit_query", generation=generation)
+    if symbols:
+        await fetch_quotes(symbols)
+
+refresh_jobs = [
+    *(RefreshJob(dataset, REFRESH_REFERENCE_INTERVAL, reference_refresher(dataset)) for dataset in REFERENCE_CACHE_TTLS),
+    RefreshJob("transactions", REFRESH_TRANSACTIONS_INTERVAL, refresh_transactions),
+    RefreshJob("heldPrices", REFRESH_PRICES_INTERVAL, refresh_held_prices),
+]
+
+@app.get("/refreshStatus")
+async def refresh_status(request: Request, key: str = Query(None)):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return {"enabled": WARMUP_ENABLED, "jobs": {job.name: job.status() for job in refresh_jobs}}
+
+@app.get("/cacheStats")
+async def cache_stats(request: Request, key: str = Query(None)):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return {"query": query_cache.stats(), "encoded": encoded_cache.stats(), "prices": price_cache.stats(), "rewards": reward_cache.stats()}
+
+@app.get("/upstreamHealth")
+async def upstream_health(request: Request, key: str = Query(None)):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return {
+        "ords": ords_upstream.stats(),
+        "yahoo": yahoo_upstream.stats(),
+        "coalesced": {"queries": query_flight.shared, "quotes": quote_flight.shared},
+    }
+
+@app.get("/startupInfo")
+async def startup_info(request: Request, key: str = Query(None)):
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return {
+        **STARTUP,
+        "uptimeSeconds": round(monotonic() - IMPORT_STARTED, 3),
+        "lazyImports": {m.name: {"loaded": m.module is not None, "importSeconds": m.import_seconds} for m in LAZY_MODULES},
+        "settingsProblems": settings.problems,
+    }
+
+def cache_metrics() -> List[str]:
+    caches = {"query": query_cache, "encoded": encoded_cache, "prices": price_cache, "rewards": reward_cache}
+    lines = []
+    for metric, kind, help_text, field in (
+        ("cache_hits_total", "counter", "Cache lookups served from the cache.", "hits"),
+        ("cache_misses_total", "counter", "Cache lookups that went upstream.", "misses"),
+        ("cache_entries", "gauge", "Entries currently held.", "entries"),
+        ("cache_hit_ratio", "gauge", "hits / (hits + misses) since start.", "hitRatio"),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        for name, cache in caches.items():
+            value = cache.stats()[field]
+            if value is not None:
+                lines.append(f'{metric}{{cache="{name}"}} {value}')
+    return lines
+
+@app.get("/metrics")
+async def metrics(request: Request, key: str = Query(None)):
+    """Everything above in Prometheus text exposition format."""
+    client_key = request.headers.get("X-API-Key") or key
+    if client_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    lines = []
+    for metric in (request_seconds, response_bytes, requests_in_flight, upstream_seconds, upstreams_in_flight, yahoo_call_seconds):
+        lines += metric.render()
+    lines += cache_metrics()
+    return Response(content="\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
 
-    return {"count": len(results), "results": results}
-        
 @app.get("/ping")
-def ping():
+async def ping():
     return {"message": "ping success"}
+
+STARTUP["moduleImportSeconds"] = round(monotonic() - IMPORT_STARTED, 3)
+
+ROUTE_PATHS = frozenset(getattr(route, "path", None) for route in app.routes)
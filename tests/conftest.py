@@ -0,0 +1,12 @@
+import os
+import sys
+
+# main reads its required settings at import time
+os.environ.setdefault("API_KEY", "test")
+os.environ.setdefault("DB_URL", "https://ords.invalid/sql")
+os.environ.setdefault("DB_USER", "test")
+os.environ.setdefault("DB_PASSWORD", "test")
+os.environ.setdefault("SYMBOL_META_DB", ":memory:")
+os.environ.setdefault("WARMUP_ENABLED", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
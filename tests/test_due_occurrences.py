@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from main import due_occurrences
+
+
+def due(as_of, **rule):
+    rule = {"START_DATE": None, "LAST_GEN_DT": None, "FREQUENCY": "MONTHLY", "RECUR_DAY": np.nan, **rule}
+    occ = due_occurrences(pd.DataFrame([rule]), np.datetime64(as_of, "D"))
+    return [str(d)[:10] for d in occ["DATE"]]
+
+
+def test_month_end_day_is_clamped_to_short_months():
+    assert due("2024-04-30", START_DATE="2024-01-31", RECUR_DAY=31) == [
+        "2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30",
+    ]
+
+
+def test_missing_recur_day_uses_start_date_day():
+    assert due("2024-03-20", START_DATE="2024-01-15") == ["2024-01-15", "2024-02-15", "2024-03-15"]
+
+
+def test_recur_day_before_start_day_begins_next_month():
+    assert due("2024-03-31", START_DATE="2024-01-20", RECUR_DAY=5) == ["2024-02-05", "2024-03-05"]
+
+
+def test_only_dates_after_last_gen_up_to_as_of_inclusive():
+    assert due("2024-04-10", START_DATE="2024-01-10", LAST_GEN_DT="2024-02-10", RECUR_DAY=10) == [
+        "2024-03-10", "2024-04-10",
+    ]
+
+
+def test_weekly_and_quarterly_steps():
+    assert due("2024-01-29", START_DATE="2024-01-01", FREQUENCY="weekly ") == [
+        "2024-01-01", "2024-01-08", "2024-01-15", "2024-01-22", "2024-01-29",
+    ]
+    assert due("2024-12-31", START_DATE="2024-02-29", FREQUENCY="QUARTERLY") == [
+        "2024-02-29", "2024-05-29", "2024-08-29", "2024-11-29",
+    ]
+
+
+def test_nothing_due_before_start_or_for_unknown_frequency():
+    assert due("2024-01-01", START_DATE="2024-02-01") == []
+    assert due("2024-12-31", START_DATE="2024-01-01", FREQUENCY="HOURLY") == []